@@ -1,17 +1,26 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, ForeignKey, Float, Integer, JSON, Enum, and_, or_
+from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, ForeignKey, Float, Integer, JSON, Enum, Index, and_, or_, func, select, text, insert, tuple_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
-from sqlalchemy.dialects.postgresql import UUID
-from pydantic import BaseModel
+from sqlalchemy.dialects.postgresql import UUID, TSRANGE, Range, ExcludeConstraint, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, NamedTuple, Set
+from collections import OrderedDict, deque
 import os
 import uuid
 import json
 import enum
 import asyncio
+import base64
+import csv
+import codecs
+import io
+import bisect
+import time
 import httpx
 from dotenv import load_dotenv
 import logging
@@ -61,12 +70,18 @@ class Dock(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=False)
     door_no = Column(String(50), nullable=False)
-    capabilities = Column(JSON)  # JSON capabilities
+    capabilities = Column(JSON)  # JSON capabilities; {"lat": ..., "lon": ...} positions the door for the yard
     status = Column(Enum(DockStatusEnum), default=DockStatusEnum.available)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Keyset pagination orders by (window_start, id) under each common filter
+        Index("ix_appointments_location_window", "location_id", "window_start", "id", postgresql_concurrently=True),
+        Index("ix_appointments_carrier_window", "carrier_id", "window_start", "id", postgresql_concurrently=True),
+        Index("ix_appointments_status_window", "status", "window_start", "id", postgresql_concurrently=True),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=False)
@@ -78,16 +93,32 @@ class Appointment(Base):
     status = Column(Enum(AppointmentStatusEnum), default=AppointmentStatusEnum.scheduled)
     priority = Column(Integer, default=5)
     dock_id = Column(UUID(as_uuid=True), ForeignKey("docks.id"))
+    dock_requirements = Column(JSON)  # e.g. {"equipment_type": "reefer", "features": ["liftgate"]}
     created_by = Column(String(200), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class DockReservation(Base):
+    """Ledger of dock holds; the exclusion constraint rejects overlapping holds on a dock"""
+    __tablename__ = "dock_reservations"
+    __table_args__ = (
+        ExcludeConstraint(
+            ("dock_id", "="), ("period", "&&"),
+            name="dock_reservations_no_overlap", using="gist"
+        ),
+    )
+    
+    appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id", ondelete="CASCADE"), primary_key=True)
+    dock_id = Column(UUID(as_uuid=True), ForeignKey("docks.id"), nullable=False)
+    period = Column(TSRANGE, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class SlotRule(Base):
     __tablename__ = "slot_rules"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=False)
     dock_group = Column(String(100))  # e.g., "loading", "unloading"
-    capacity_per_slot = Column(Integer, default=1)
+    capacity_per_slot = Column(Integer, default=1)  # Concurrent appointments per dock of the group
     slot_minutes = Column(Integer, default=60)  # Default 1 hour slots
     windows = Column(JSON)  # Time windows JSON
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -104,6 +135,17 @@ class AppointmentCreate(BaseModel):
     dock_requirements: Optional[Dict[str, Any]] = None
     created_by: str
 
+class BulkAutoAssignRequest(BaseModel):
+    location_id: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    appointment_ids: Optional[List[str]] = None
+
+class DockOptimizeRequest(BaseModel):
+    location_id: str
+    date: datetime
+    dry_run: bool = False
+
 class AppointmentUpdate(BaseModel):
     window_start: Optional[datetime] = None
     window_end: Optional[datetime] = None
@@ -111,14 +153,33 @@ class AppointmentUpdate(BaseModel):
     priority: Optional[int] = None
     dock_id: Optional[str] = None
 
+# yard-management-service reads door positions from the dock capabilities
+DOCK_CAPABILITIES_DESCRIPTION = (
+    'Free-form dock capabilities. "lat" and "lon" (WGS84 degrees) place the door in the yard; '
+    "docks without them are left out of yard spot choice and jockey move planning."
+)
+
 class DockCreate(BaseModel):
     location_id: str
     door_no: str
-    capabilities: Optional[Dict[str, Any]] = None
+    capabilities: Optional[Dict[str, Any]] = Field(None, description=DOCK_CAPABILITIES_DESCRIPTION)
 
 class DockUpdate(BaseModel):
     status: Optional[str] = None
-    capabilities: Optional[Dict[str, Any]] = None
+    capabilities: Optional[Dict[str, Any]] = Field(None, description=DOCK_CAPABILITIES_DESCRIPTION)
+
+class SlotRuleCreate(BaseModel):
+    location_id: str
+    dock_group: Optional[str] = None
+    capacity_per_slot: int = 1
+    slot_minutes: int = 60
+    windows: Optional[List[Dict[str, Any]]] = None
+
+class SlotRuleUpdate(BaseModel):
+    dock_group: Optional[str] = None
+    capacity_per_slot: Optional[int] = None
+    slot_minutes: Optional[int] = None
+    windows: Optional[List[Dict[str, Any]]] = None
 
 class SlotAvailabilityRequest(BaseModel):
     location_id: str
@@ -149,6 +210,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Setup logging
@@ -164,35 +226,6 @@ def get_db():
         db.close()
 
 # Utility functions
-def check_dock_compatibility(dock_capabilities: Dict, requirements: Dict) -> bool:
-    """Check if dock meets appointment requirements"""
-    if not requirements:
-        return True
-    
-    if not dock_capabilities:
-        return False
-    
-    # Check equipment type compatibility
-    if requirements.get("equipment_type"):
-        supported_types = dock_capabilities.get("equipment_types", [])
-        if requirements["equipment_type"] not in supported_types:
-            return False
-    
-    # Check height clearance
-    if requirements.get("height_feet"):
-        max_height = dock_capabilities.get("max_height_feet", 0)
-        if requirements["height_feet"] > max_height:
-            return False
-    
-    # Check special requirements
-    required_features = requirements.get("features", [])
-    available_features = dock_capabilities.get("features", [])
-    for feature in required_features:
-        if feature not in available_features:
-            return False
-    
-    return True
-
 def calculate_availability_score(slot_start: datetime, slot_end: datetime, 
                                 existing_appointments: List[Appointment]) -> float:
     """Calculate availability score for a time slot (0.0 to 1.0)"""
@@ -209,26 +242,761 @@ def calculate_availability_score(slot_start: datetime, slot_end: datetime,
     
     return max(0.0, score)
 
+# Compiled slot schedules
+#
+# Slot rule windows look like [{"start": "08:00", "end": "17:00", "days": [1, 2, 3, 4, 5]}]
+# with days 1=Monday .. 7=Sunday (0 is also accepted for Sunday). Each rule is
+# compiled into weekly bitmaps with one bit per minute, bit 0 = Monday 00:00.
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DAY_MASK = (1 << MINUTES_PER_DAY) - 1
+WEEK_MASK = (1 << MINUTES_PER_WEEK) - 1
+
+def parse_clock(value: str) -> int:
+    """Convert "HH:MM" to minutes after midnight ("24:00" allowed)"""
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+def bit_range(start: int, end: int) -> int:
+    """Bitmap with bits [start, end) set"""
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+def wrap_week(bits: int) -> int:
+    """Fold bits past Sunday midnight back onto Monday"""
+    return (bits | (bits >> MINUTES_PER_WEEK)) & WEEK_MASK
+
+def runs_of(bits: int, length: int) -> int:
+    """Bit p is set when bits p .. p+length-1 are all set"""
+    acc = bits
+    width = 1
+    while width < length:
+        step = min(width, length - width)
+        acc &= acc >> step
+        width += step
+    return acc
+
+def iter_bits(bits: int):
+    """Yield the positions of set bits, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def project_week(week_bits: int, origin: datetime, days: int) -> int:
+    """Lay the weekly bitmap out over consecutive days starting at origin"""
+    bits = 0
+    for day in range(days):
+        weekday = (origin + timedelta(days=day)).weekday()
+        day_bits = (week_bits >> (weekday * MINUTES_PER_DAY)) & DAY_MASK
+        bits |= day_bits << (day * MINUTES_PER_DAY)
+    return bits
+
+class CompiledSlotRule:
+    """A slot rule flattened into weekly open-minute and slot-start bitmaps"""
+    
+    def __init__(self, dock_group: Optional[str], slot_minutes: int,
+                 capacity: Optional[int], open_bits: int, start_bits: int):
+        self.dock_group = dock_group
+        self.slot_minutes = slot_minutes
+        self.capacity = capacity  # Per dock of the group; None means unlimited
+        self.open_bits = open_bits
+        self.start_bits = start_bits
+
+class LocationSchedule:
+    """All compiled slot rules of a location"""
+    
+    def __init__(self, rules: List[CompiledSlotRule]):
+        self.rules = rules
+        self.grouped = {rule.dock_group for rule in rules if rule.dock_group is not None}
+        # Minutes open per dock group, so long appointments can span adjacent windows
+        self.group_open: Dict[Optional[str], int] = {}
+        for rule in rules:
+            self.group_open[rule.dock_group] = self.group_open.get(rule.dock_group, 0) | rule.open_bits
+    
+    def rule_group(self, dock_group: Optional[str]) -> Optional[str]:
+        """Docks whose group has no rule of its own fall under the ungrouped rules"""
+        return dock_group if dock_group in self.grouped else None
+
+def compile_slot_rule(rule: SlotRule) -> CompiledSlotRule:
+    """Compile one SlotRule row into weekly bitmaps"""
+    windows = rule.windows
+    if isinstance(windows, str):
+        windows = json.loads(windows)
+    slot_minutes = max(1, rule.slot_minutes or 60)
+    
+    open_bits = 0
+    start_bits = 0
+    for window in windows or [{"start": "00:00", "end": "24:00"}]:
+        start = parse_clock(window.get("start", "00:00"))
+        end = parse_clock(window.get("end", "24:00"))
+        if end <= start:
+            end += MINUTES_PER_DAY  # Overnight window
+        
+        slot_offsets = 0
+        for slot_start in range(start, end - slot_minutes + 1, slot_minutes):
+            slot_offsets |= 1 << slot_start
+        
+        for day in window.get("days") or range(1, 8):
+            day_offset = ((int(day) - 1) % 7) * MINUTES_PER_DAY
+            open_bits |= wrap_week(bit_range(start, end) << day_offset)
+            start_bits |= wrap_week(slot_offsets << day_offset)
+    
+    return CompiledSlotRule(rule.dock_group, slot_minutes, rule.capacity_per_slot,
+                            open_bits, start_bits)
+
+def default_location_schedule() -> LocationSchedule:
+    """Schedule for locations without slot rules: 30-minute starts from 6 AM to 6 PM"""
+    slot_offsets = 0
+    for slot_start in range(6 * 60, 18 * 60, 30):
+        slot_offsets |= 1 << slot_start
+    start_bits = 0
+    for day in range(7):
+        start_bits |= slot_offsets << (day * MINUTES_PER_DAY)
+    return LocationSchedule([CompiledSlotRule(None, 30, None, WEEK_MASK, start_bits)])
+
+DEFAULT_SCHEDULE = default_location_schedule()
+
+SLOT_RULE_VERIFY_SECONDS = float(os.getenv("SLOT_RULE_VERIFY_SECONDS", "30"))
+
+# location_id -> (verified at, rule fingerprint, compiled schedule)
+_schedule_cache: Dict[str, Tuple[float, tuple, LocationSchedule]] = {}
+
+def get_location_schedule(location_id: str, db: Session) -> LocationSchedule:
+    """Return the compiled schedule for a location without reading its rules on every request.
+    
+    Rule edits in this worker invalidate the schedule at once; edits from other
+    workers are picked up when it is re-verified, every SLOT_RULE_VERIFY_SECONDS.
+    """
+    now = time.monotonic()
+    cached = _schedule_cache.get(str(location_id))
+    if cached and now - cached[0] <= SLOT_RULE_VERIFY_SECONDS:
+        return cached[2]
+    
+    slot_rules = db.query(SlotRule).filter(SlotRule.location_id == location_id).all()
+    fingerprint = tuple(sorted(
+        (str(rule.id), rule.dock_group or "", rule.capacity_per_slot, rule.slot_minutes,
+         json.dumps(rule.windows, sort_keys=True, default=str))
+        for rule in slot_rules
+    ))
+    if cached and cached[1] == fingerprint:
+        schedule = cached[2]
+    elif slot_rules:
+        schedule = LocationSchedule([compile_slot_rule(rule) for rule in slot_rules])
+    else:
+        schedule = DEFAULT_SCHEDULE
+    _schedule_cache[str(location_id)] = (now, fingerprint, schedule)
+    return schedule
+
+def invalidate_location_schedule(location_id: str):
+    """Drop a location's compiled schedule after its slot rules change"""
+    _schedule_cache.pop(str(location_id), None)
+
+def dock_group_of(dock: Dock) -> Optional[str]:
+    """Dock group from capabilities, e.g. {"dock_group": "loading"} or {"type": "loading"}"""
+    capabilities = dock.capabilities or {}
+    return capabilities.get("dock_group") or capabilities.get("type")
+
+def saturated_bits(intervals: List[Tuple[int, int]], capacity: Optional[int]) -> int:
+    """Minutes where at least `capacity` of the intervals overlap"""
+    if capacity is None or not intervals:
+        return 0
+    if capacity <= 0:
+        return -1  # Rule admits nothing
+    
+    # Ends sort before starts at the same minute
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    bits = 0
+    level = 0
+    since = None
+    for minute, delta in events:
+        level += delta
+        if level >= capacity and since is None:
+            since = minute
+        elif level < capacity and since is not None:
+            bits |= bit_range(since, minute)
+            since = None
+    return bits
+
+# Dock capability index
+#
+# Dock capabilities look like {"equipment_types": ["van", "reefer"],
+# "features": ["liftgate"], "max_height_feet": 14}. Per location they are
+# compiled into one bitmap per capability over dock positions, so matching
+# requirements is a handful of big-int ANDs across all docks at once.
+class DockCapabilityIndex:
+    """Capability bitmaps over the docks of one location (bit i = docks[i])"""
+    
+    def __init__(self, docks: List[Dock]):
+        self.dock_ids = [dock.id for dock in docks]
+        self.all_docks = bit_range(0, len(docks))
+        self.with_capabilities = 0
+        self.capability_docks: Dict[Tuple[str, Any], int] = {}
+        
+        heights = []
+        for pos, dock in enumerate(docks):
+            capabilities = dock.capabilities or {}
+            if not capabilities:
+                continue
+            bit = 1 << pos
+            self.with_capabilities |= bit
+            for equipment_type in capabilities.get("equipment_types") or []:
+                self._add("equipment_type", equipment_type, bit)
+            for feature in capabilities.get("features") or []:
+                self._add("feature", feature, bit)
+            heights.append((parse_height(capabilities.get("max_height_feet")), pos))
+        
+        # taller[k] holds the docks from heights[k] up
+        heights.sort()
+        self.heights = [height for height, _ in heights]
+        self.taller = [0] * (len(heights) + 1)
+        for k in range(len(heights) - 1, -1, -1):
+            self.taller[k] = self.taller[k + 1] | (1 << heights[k][1])
+    
+    def _add(self, kind: str, value: Any, bit: int):
+        try:
+            self.capability_docks[(kind, value)] = self.capability_docks.get((kind, value), 0) | bit
+        except TypeError:
+            pass  # Unhashable values never match a requirement
+    
+    def _docks_with(self, kind: str, value: Any) -> int:
+        try:
+            return self.capability_docks.get((kind, value), 0)
+        except TypeError:
+            return 0
+    
+    def compatible(self, requirements: Dict) -> int:
+        """Bitmap of docks meeting the appointment requirements"""
+        if not requirements:
+            return self.all_docks
+        
+        mask = self.with_capabilities
+        
+        # Check equipment type compatibility
+        if requirements.get("equipment_type"):
+            mask &= self._docks_with("equipment_type", requirements["equipment_type"])
+        
+        # Check height clearance
+        if requirements.get("height_feet"):
+            mask &= self.taller[bisect.bisect_left(self.heights, parse_height(requirements["height_feet"]))]
+        
+        # Check special requirements
+        for feature in requirements.get("features") or []:
+            mask &= self._docks_with("feature", feature)
+        
+        return mask
+    
+    def compatible_ids(self, requirements: Dict) -> Set[Any]:
+        mask = self.compatible(requirements)
+        return {dock_id for pos, dock_id in enumerate(self.dock_ids) if mask >> pos & 1}
+
+def parse_height(value: Any) -> float:
+    """Heights in feet, accepting numbers or strings like "14ft"; anything else is 0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).lower().replace("ft", "").strip())
+    except ValueError:
+        return 0.0
+
+# location_id -> ((dock id, updated_at) per dock, compiled index)
+_capability_cache: Dict[str, Tuple[tuple, DockCapabilityIndex]] = {}
+
+def get_dock_capability_index(location_id: str, docks: List[Dock]) -> DockCapabilityIndex:
+    """Return the location's capability index, recompiling when any dock changed"""
+    fingerprint = tuple((dock.id, dock.updated_at) for dock in docks)
+    cached = _capability_cache.get(str(location_id))
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    
+    index = DockCapabilityIndex(docks)
+    _capability_cache[str(location_id)] = (fingerprint, index)
+    return index
+
+def invalidate_dock_capabilities(location_id: str):
+    """Drop a location's capability index after a dock is created or updated"""
+    _capability_cache.pop(str(location_id), None)
+
+# Statuses that hold a dock for their window
+ACTIVE_APPOINTMENT_STATUSES = [
+    AppointmentStatusEnum.scheduled,
+    AppointmentStatusEnum.arriving,
+    AppointmentStatusEnum.arrived,
+    AppointmentStatusEnum.at_dock,
+    AppointmentStatusEnum.loading
+]
+
+# Statuses whose appointment is physically on the dock and may run over
+RUNNING_APPOINTMENT_STATUSES = [
+    AppointmentStatusEnum.at_dock,
+    AppointmentStatusEnum.loading
+]
+
+class DockTimeline:
+    """Appointments of a single dock sorted by window_start for bisect lookups"""
+    
+    def __init__(self, appointments: List[Appointment]):
+        self.appointments = sorted(appointments, key=lambda appt: appt.window_start)
+        self.starts = [appt.window_start for appt in self.appointments]
+        self.max_duration = max(
+            (appt.window_end - appt.window_start for appt in self.appointments),
+            default=timedelta(0)
+        )
+        self.running_ends = sorted(
+            appt.window_end for appt in self.appointments
+            if appt.status in RUNNING_APPOINTMENT_STATUSES
+        )
+    
+    def overlapping(self, slot_start: datetime, slot_end: datetime) -> List[Appointment]:
+        """Appointments overlapping [slot_start, slot_end)"""
+        # Anything starting before slot_start - max_duration has already ended
+        lo = bisect.bisect_left(self.starts, slot_start - self.max_duration)
+        hi = bisect.bisect_left(self.starts, slot_end)
+        return [
+            appt for appt in self.appointments[lo:hi]
+            if appt.window_end > slot_start
+        ]
+    
+    def overrun_minutes(self, slot_start: datetime) -> int:
+        """Possible delay from the latest running appointment that ended by slot_start"""
+        idx = bisect.bisect_right(self.running_ends, slot_start)
+        if idx == 0:
+            return 0
+        potential_delay = (slot_start - self.running_ends[idx - 1]).total_seconds() / 60
+        return int(max(0, min(30, potential_delay)))  # Max 30 min delay
+    
+    def add(self, appointment: Appointment):
+        """Insert an appointment, keeping the timeline sorted"""
+        idx = bisect.bisect_right(self.starts, appointment.window_start)
+        self.appointments.insert(idx, appointment)
+        self.starts.insert(idx, appointment.window_start)
+        self.max_duration = max(self.max_duration, appointment.window_end - appointment.window_start)
+        if appointment.status in RUNNING_APPOINTMENT_STATUSES:
+            bisect.insort(self.running_ends, appointment.window_end)
+    
+    def remove(self, appointment: Appointment):
+        """Take an appointment back out of the timeline"""
+        idx = bisect.bisect_left(self.starts, appointment.window_start)
+        while self.appointments[idx] is not appointment:
+            idx += 1
+        del self.appointments[idx]
+        del self.starts[idx]
+        if appointment.status in RUNNING_APPOINTMENT_STATUSES:
+            self.running_ends.remove(appointment.window_end)
+    
+    def latest_end_before(self, slot_start: datetime) -> Optional[datetime]:
+        """Latest window_end among appointments starting before slot_start"""
+        lo = bisect.bisect_left(self.starts, slot_start - self.max_duration)
+        hi = bisect.bisect_left(self.starts, slot_start)
+        return max((appt.window_end for appt in self.appointments[lo:hi]), default=None)
+
+def build_dock_timelines(docks: List[Dock], appointments: List[Appointment]) -> Dict[Any, DockTimeline]:
+    """Group appointments by dock once per request"""
+    by_dock: Dict[Any, List[Appointment]] = {dock.id: [] for dock in docks}
+    for appt in appointments:
+        if appt.dock_id in by_dock:
+            by_dock[appt.dock_id].append(appt)
+    return {dock_id: DockTimeline(appts) for dock_id, appts in by_dock.items()}
+
+def admitted_slots(docks: List[Dock], appointments: List[Appointment],
+                   start_date: datetime, end_date: datetime, duration_minutes: int,
+                   schedule: LocationSchedule,
+                   dock_groups: Dict[Any, Optional[str]]) -> Tuple[datetime, Dict[int, List[List[Dock]]]]:
+    """Slot starts the schedule admits, as minutes from origin mapped to the dock lists of the admitting rules"""
+    # Lay the weekly bitmaps over the requested days, one bit per minute from origin
+    origin = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = (end_date - origin).days + 1
+    first_start = -(-int((start_date - origin).total_seconds()) // 60)
+    last_start = int((end_date - origin).total_seconds()) // 60 - duration_minutes
+    if last_start < first_start:
+        return origin, {}
+    in_range = bit_range(first_start, last_start + 1)
+    
+    # Appointment minutes per rule group, for capacity counting
+    # Clamped to the laid-out days; appointments may start before origin or run past the last day
+    group_intervals: Dict[Optional[str], List[Tuple[int, int]]] = {}
+    capacity_limited = any(rule.capacity is not None for rule in schedule.rules)
+    horizon = days * MINUTES_PER_DAY
+    for appt in appointments if capacity_limited else []:
+        group = schedule.rule_group(dock_groups.get(appt.dock_id))
+        start = max(int((appt.window_start - origin).total_seconds()) // 60, 0)
+        end = min(-(-int((appt.window_end - origin).total_seconds()) // 60), horizon)
+        if end > start:
+            group_intervals.setdefault(group, []).append((start, end))
+    
+    group_open = {
+        group: project_week(bits, origin, days)
+        for group, bits in schedule.group_open.items()
+    }
+    
+    # Capacity is per dock, so a group saturates only when all of its docks are booked up
+    group_docks: Dict[Optional[str], int] = {}
+    for dock_group in dock_groups.values():
+        group = schedule.rule_group(dock_group)
+        group_docks[group] = group_docks.get(group, 0) + 1
+    
+    candidates: Dict[int, List[List[Dock]]] = {}
+    for rule in schedule.rules:
+        rule_docks = [
+            dock for dock in docks
+            if schedule.rule_group(dock_groups.get(dock.id)) == rule.dock_group
+        ]
+        if not rule_docks:
+            continue
+        
+        capacity = None if rule.capacity is None else rule.capacity * group_docks.get(rule.dock_group, 0)
+        free = group_open[rule.dock_group] & ~saturated_bits(
+            group_intervals.get(rule.dock_group, []), capacity
+        )
+        starts = project_week(rule.start_bits, origin, days) & in_range & runs_of(free, duration_minutes)
+        for minute in iter_bits(starts):
+            candidates.setdefault(minute, []).append(rule_docks)
+    
+    return origin, candidates
+
+def merge_dock_lists(dock_lists: List[List[Dock]]) -> List[Dock]:
+    """Docks of every admitting rule, first occurrence wins"""
+    if len(dock_lists) == 1:
+        return dock_lists[0]
+    return list({dock.id: dock for docks in dock_lists for dock in docks}.values())
+
+def rank_slots(compatible_docks: List[Dock], existing_appointments: List[Appointment],
+               start_date: datetime, end_date: datetime, duration_minutes: int,
+               schedule: Optional[LocationSchedule] = None,
+               dock_groups: Optional[Dict[Any, Optional[str]]] = None) -> List[SlotRecommendation]:
+    """Score every slot the schedule admits against the per-dock timelines"""
+    schedule = schedule or DEFAULT_SCHEDULE
+    if dock_groups is None:
+        dock_groups = {dock.id: dock_group_of(dock) for dock in compatible_docks}
+    timelines = build_dock_timelines(compatible_docks, existing_appointments)
+    origin, candidates = admitted_slots(compatible_docks, existing_appointments,
+                                        start_date, end_date, duration_minutes,
+                                        schedule, dock_groups)
+    
+    recommendations = []
+    slot_duration = timedelta(minutes=duration_minutes)
+    
+    for minute in sorted(candidates):
+        current_time = origin + timedelta(minutes=minute)
+        slot_end = current_time + slot_duration
+        
+        # Find best dock for this slot
+        best_dock = None
+        best_score = 0
+        
+        for dock in merge_dock_lists(candidates[minute]):
+            score = calculate_availability_score(
+                current_time, slot_end,
+                timelines[dock.id].overlapping(current_time, slot_end)
+            )
+            
+            if score > best_score:
+                best_score = score
+                best_dock = dock
+                if best_score >= 1.0:
+                    break  # A free dock cannot be beaten
+        
+        if best_dock and best_score > 0.3:  # Minimum threshold
+            recommendations.append(SlotRecommendation(
+                slot_start=current_time,
+                slot_end=slot_end,
+                dock_id=str(best_dock.id),
+                dock_door_no=best_dock.door_no,
+                availability_score=best_score,
+                estimated_wait_minutes=timelines[best_dock.id].overrun_minutes(current_time)
+            ))
+    
+    # Sort by score (best first)
+    recommendations.sort(key=lambda x: x.availability_score, reverse=True)
+    
+    return recommendations[:20]  # Return top 20 recommendations
+
+# Materialized availability
+#
+# Locations read often enough are served from per-day grids of scored slots
+# instead of recomputing availability on every request. Writes in this worker
+# patch the grids in place; writes from other workers are picked up when a
+# day is re-verified against the database.
+GRID_HOT_READS = int(os.getenv("GRID_HOT_READS", "3"))
+GRID_HOT_WINDOW_SECONDS = float(os.getenv("GRID_HOT_WINDOW_SECONDS", "60"))
+GRID_VERIFY_SECONDS = float(os.getenv("GRID_VERIFY_SECONDS", "30"))
+GRID_MAX_DAYS = int(os.getenv("GRID_MAX_DAYS", "5000"))
+
+class AppointmentSnapshot(NamedTuple):
+    id: Any
+    dock_id: Any
+    window_start: datetime
+    window_end: datetime
+    priority: int
+    status: AppointmentStatusEnum
+
+class DockSnapshot(NamedTuple):
+    id: Any
+    door_no: str
+    capabilities: Optional[Dict[str, Any]]
+    status: DockStatusEnum
+    updated_at: datetime
+
+def snapshot_appointment(appointment: Appointment) -> AppointmentSnapshot:
+    return AppointmentSnapshot(
+        appointment.id, appointment.dock_id, appointment.window_start,
+        appointment.window_end, appointment.priority, appointment.status
+    )
+
+class GridDay:
+    """Scored slots starting on one day at one location for one slot duration"""
+    
+    def __init__(self, day: datetime, duration_minutes: int):
+        self.day = day
+        self.duration_minutes = duration_minutes
+        # Slots may run past midnight, so the window covers the spill-over too
+        self.window_start = day
+        self.window_end = day + timedelta(days=1, minutes=duration_minutes)
+        self.docks: List[DockSnapshot] = []
+        self.schedule: Optional[LocationSchedule] = None
+        self.appointments: Dict[Any, AppointmentSnapshot] = {}
+        self.slots: List[Tuple[datetime, datetime, List[Tuple[DockSnapshot, float, int]]]] = []
+        self.dirty = True
+        self.verified_at = 0.0
+    
+    def covers(self, appointment: AppointmentSnapshot) -> bool:
+        return (appointment.status in ACTIVE_APPOINTMENT_STATUSES and
+                appointment.window_start < self.window_end and
+                appointment.window_end > self.window_start)
+    
+    def load(self, docks: List[DockSnapshot], schedule: LocationSchedule,
+             appointments: List[AppointmentSnapshot]) -> bool:
+        """Replace the inputs from a database read, returning whether they differed"""
+        appointments = {appt.id: appt for appt in appointments if self.covers(appt)}
+        changed = (docks != self.docks or schedule is not self.schedule or
+                   appointments != self.appointments)
+        if changed:
+            self.docks = docks
+            self.schedule = schedule
+            self.appointments = appointments
+            self.dirty = True
+        self.verified_at = time.monotonic()
+        return changed
+    
+    def apply(self, appointment: AppointmentSnapshot):
+        """Patch in a created, updated or cancelled appointment"""
+        removed = self.appointments.pop(appointment.id, None)
+        if self.covers(appointment):
+            self.appointments[appointment.id] = appointment
+            self.dirty = True
+        elif removed:
+            self.dirty = True
+    
+    def rebuild(self):
+        """Score every admitted slot of the day on every available dock"""
+        available = [dock for dock in self.docks if dock.status == DockStatusEnum.available]
+        dock_groups = {dock.id: dock_group_of(dock) for dock in self.docks}
+        appointments = list(self.appointments.values())
+        timelines = build_dock_timelines(available, appointments)
+        
+        # Starts stay within the day; the extra minutes only let slots run past midnight
+        origin, candidates = admitted_slots(
+            available, appointments, self.day,
+            self.day + timedelta(days=1, minutes=self.duration_minutes - 1),
+            self.duration_minutes, self.schedule, dock_groups
+        )
+        
+        slot_duration = timedelta(minutes=self.duration_minutes)
+        self.slots = []
+        for minute in sorted(candidates):
+            slot_start = origin + timedelta(minutes=minute)
+            slot_end = slot_start + slot_duration
+            cells = []
+            for dock in merge_dock_lists(candidates[minute]):
+                timeline = timelines[dock.id]
+                score = calculate_availability_score(
+                    slot_start, slot_end, timeline.overlapping(slot_start, slot_end)
+                )
+                cells.append((dock, score, timeline.overrun_minutes(slot_start)))
+            self.slots.append((slot_start, slot_end, cells))
+        self.dirty = False
+
+class AvailabilityGrid:
+    """Per-worker store of GridDays for locations with steady read traffic"""
+    
+    def __init__(self):
+        # (location_id, day, duration_minutes) -> GridDay, least recently read first
+        self.days: "OrderedDict[Tuple[str, datetime, int], GridDay]" = OrderedDict()
+        self.by_location: Dict[str, Set[Tuple[str, datetime, int]]] = {}
+        # location_id -> recent read times, least recently read location first
+        self.reads: "OrderedDict[str, deque]" = OrderedDict()
+    
+    def is_hot(self, location_id: str) -> bool:
+        """Record a read and report whether the location is worth materializing"""
+        now = time.monotonic()
+        location_id = str(location_id)
+        reads = self.reads.pop(location_id, None) or deque()
+        reads.append(now)
+        while reads and now - reads[0] > GRID_HOT_WINDOW_SECONDS:
+            reads.popleft()
+        self.reads[location_id] = reads
+        
+        # Forget locations whose last read has aged out of the window
+        while self.reads:
+            oldest = next(iter(self.reads.values()))
+            if now - oldest[-1] <= GRID_HOT_WINDOW_SECONDS:
+                break
+            self.reads.popitem(last=False)
+        return len(reads) >= GRID_HOT_READS or location_id in self.by_location
+    
+    def refresh(self, location_id: str, days: List[datetime], duration_minutes: int,
+                db: Session) -> List[datetime]:
+        """Load or re-verify days from the database, returning the days that were stale"""
+        docks = [
+            DockSnapshot(dock.id, dock.door_no, dock.capabilities, dock.status, dock.updated_at)
+            for dock in db.query(Dock).filter(Dock.location_id == location_id).order_by(Dock.id).all()
+        ]
+        schedule = get_location_schedule(location_id, db)
+        
+        span_start = min(days)
+        span_end = max(days) + timedelta(days=1, minutes=duration_minutes)
+        appointments = [
+            AppointmentSnapshot(*row) for row in db.query(
+                Appointment.id, Appointment.dock_id, Appointment.window_start,
+                Appointment.window_end, Appointment.priority, Appointment.status
+            ).filter(
+                Appointment.location_id == location_id,
+                Appointment.window_start < span_end,
+                Appointment.window_end > span_start,
+                Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+            ).all()
+        ]
+        
+        stale = []
+        for day in days:
+            key = (location_id, day, duration_minutes)
+            grid_day = self.days.get(key)
+            if grid_day is None:
+                grid_day = self.days[key] = GridDay(day, duration_minutes)
+                self.by_location.setdefault(location_id, set()).add(key)
+                grid_day.load(docks, schedule, appointments)
+            elif grid_day.load(docks, schedule, appointments):
+                stale.append(day)
+        return stale
+    
+    def get_available_slots(self, location_id: str, start_date: datetime, end_date: datetime,
+                            duration_minutes: int, dock_requirements: Dict,
+                            db: Session) -> List[SlotRecommendation]:
+        """Same result as rank_slots, served from the materialized days"""
+        location_id = str(location_id)
+        first_day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        last_start = end_date - timedelta(minutes=duration_minutes)
+        if last_start < start_date:
+            return []
+        days = [first_day + timedelta(days=i) for i in range((last_start - first_day).days + 1)]
+        
+        now = time.monotonic()
+        unverified = [
+            day for day in days
+            if (location_id, day, duration_minutes) not in self.days or
+            now - self.days[(location_id, day, duration_minutes)].verified_at > GRID_VERIFY_SECONDS
+        ]
+        if unverified:
+            self.refresh(location_id, unverified, duration_minutes, db)
+        
+        recommendations = []
+        compatible = None
+        for day in days:
+            key = (location_id, day, duration_minutes)
+            grid_day = self.days[key]
+            self.days.move_to_end(key)
+            if grid_day.dirty:
+                grid_day.rebuild()
+            if compatible is None:
+                compatible = get_dock_capability_index(
+                    location_id, grid_day.docks
+                ).compatible_ids(dock_requirements)
+            
+            for slot_start, slot_end, cells in grid_day.slots:
+                if slot_start < start_date or slot_end > end_date:
+                    continue
+                
+                best = None
+                for cell in cells:
+                    if cell[0].id in compatible and (best is None or cell[1] > best[1]):
+                        best = cell
+                        if best[1] >= 1.0:
+                            break  # A free dock cannot be beaten
+                
+                if best and best[1] > 0.3:  # Minimum threshold
+                    recommendations.append(SlotRecommendation(
+                        slot_start=slot_start,
+                        slot_end=slot_end,
+                        dock_id=str(best[0].id),
+                        dock_door_no=best[0].door_no,
+                        availability_score=best[1],
+                        estimated_wait_minutes=best[2]
+                    ))
+        
+        self.evict()
+        
+        # Sort by score (best first)
+        recommendations.sort(key=lambda x: x.availability_score, reverse=True)
+        
+        return recommendations[:20]  # Return top 20 recommendations
+    
+    def apply_appointment(self, appointment: Appointment):
+        """Patch a written appointment into the location's materialized days"""
+        keys = self.by_location.get(str(appointment.location_id))
+        if not keys:
+            return
+        snapshot = snapshot_appointment(appointment)
+        for key in keys:
+            self.days[key].apply(snapshot)
+    
+    def invalidate_location(self, location_id: str):
+        """Drop a location's days after its docks or slot rules change"""
+        for key in self.by_location.pop(str(location_id), set()):
+            self.days.pop(key, None)
+    
+    def check(self, location_id: str, db: Session) -> List[datetime]:
+        """Re-verify every materialized day of a location, returning the stale ones"""
+        by_duration: Dict[int, List[datetime]] = {}
+        for _, day, duration_minutes in self.by_location.get(str(location_id), set()):
+            by_duration.setdefault(duration_minutes, []).append(day)
+        
+        stale = []
+        for duration_minutes, days in by_duration.items():
+            stale.extend(self.refresh(str(location_id), days, duration_minutes, db))
+        return sorted(stale)
+    
+    def evict(self):
+        while len(self.days) > GRID_MAX_DAYS:
+            key, _ = self.days.popitem(last=False)
+            keys = self.by_location.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_location[key[0]]
+
+availability_grid = AvailabilityGrid()
+
 def get_available_slots(location_id: str, start_date: datetime, end_date: datetime,
                        duration_minutes: int, dock_requirements: Dict,
                        db: Session) -> List[SlotRecommendation]:
     """Find available appointment slots"""
     
-    # Get location's slot rules
-    slot_rules = db.query(SlotRule).filter(
-        SlotRule.location_id == location_id
-    ).all()
+    if availability_grid.is_hot(location_id):
+        return availability_grid.get_available_slots(
+            location_id, start_date, end_date, duration_minutes, dock_requirements, db
+        )
     
-    # Get compatible docks
-    docks = db.query(Dock).filter(
-        Dock.location_id == location_id,
-        Dock.status == DockStatusEnum.available
-    ).all()
+    # All docks at the location, so appointments on busy docks still count toward capacity
+    docks = db.query(Dock).filter(Dock.location_id == location_id).order_by(Dock.id).all()
+    dock_groups = {dock.id: dock_group_of(dock) for dock in docks}
     
-    compatible_docks = []
-    for dock in docks:
-        if check_dock_compatibility(dock.capabilities or {}, dock_requirements or {}):
-            compatible_docks.append(dock)
+    # Get compatible docks
+    compatible = get_dock_capability_index(location_id, docks).compatible(dock_requirements)
+    compatible_docks = [
+        dock for pos, dock in enumerate(docks)
+        if compatible >> pos & 1 and dock.status == DockStatusEnum.available
+    ]
     
     if not compatible_docks:
         return []
@@ -238,71 +1006,74 @@ def get_available_slots(location_id: str, start_date: datetime, end_date: dateti
         Appointment.location_id == location_id,
         Appointment.window_start < end_date,
         Appointment.window_end > start_date,
-        Appointment.status.in_([
-            AppointmentStatusEnum.scheduled,
-            AppointmentStatusEnum.arriving,
-            AppointmentStatusEnum.arrived,
-            AppointmentStatusEnum.at_dock,
-            AppointmentStatusEnum.loading
-        ])
+        Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
     ).all()
     
-    # Generate time slots
-    recommendations = []
-    current_time = start_date
-    slot_duration = timedelta(minutes=duration_minutes)
+    return rank_slots(compatible_docks, existing_appointments,
+                      start_date, end_date, duration_minutes,
+                      get_location_schedule(location_id, db), dock_groups)
+
+# Dock reservation ledger
+def hold_dock(appointment: Appointment, dock_id: Any, db: Session) -> bool:
+    """Reserve a dock for the appointment's window in a savepoint.
+    Returns False when the window overlaps another reservation on that dock."""
+    try:
+        with db.begin_nested():
+            period = Range(appointment.window_start, appointment.window_end, bounds="[)")
+            reservation = db.get(DockReservation, appointment.id)
+            if reservation:
+                reservation.dock_id = dock_id
+                reservation.period = period
+            else:
+                db.add(DockReservation(appointment_id=appointment.id, dock_id=dock_id, period=period))
+    except IntegrityError:
+        return False
     
-    while current_time + slot_duration <= end_date:
-        slot_end = current_time + slot_duration
-        
-        # Check business hours (default 6 AM to 6 PM)
-        if 6 <= current_time.hour < 18:
-            # Find best dock for this slot
-            best_dock = None
-            best_score = 0
-            
-            for dock in compatible_docks:
-                # Filter appointments for this specific dock
-                dock_appointments = [
-                    appt for appt in existing_appointments 
-                    if appt.dock_id == dock.id
-                ]
-                
-                score = calculate_availability_score(
-                    current_time, slot_end, dock_appointments
-                )
-                
-                if score > best_score:
-                    best_score = score
-                    best_dock = dock
-            
-            if best_dock and best_score > 0.3:  # Minimum threshold
-                # Calculate estimated wait time
-                wait_minutes = 0
-                for appt in existing_appointments:
-                    if (appt.dock_id == best_dock.id and 
-                        appt.window_end <= current_time and
-                        appt.status in [AppointmentStatusEnum.at_dock, AppointmentStatusEnum.loading]):
-                        # Appointment might run over
-                        potential_delay = (current_time - appt.window_end).total_seconds() / 60
-                        wait_minutes = max(0, min(30, potential_delay))  # Max 30 min delay
-                
-                recommendations.append(SlotRecommendation(
-                    slot_start=current_time,
-                    slot_end=slot_end,
-                    dock_id=str(best_dock.id),
-                    dock_door_no=best_dock.door_no,
-                    availability_score=best_score,
-                    estimated_wait_minutes=int(wait_minutes)
-                ))
-        
-        # Move to next slot
-        current_time += timedelta(minutes=30)  # 30-minute increments
+    appointment.dock_id = dock_id
+    return True
+
+def release_dock(appointment: Appointment, db: Session):
+    """Drop the appointment's reservation, keeping dock_id for the record"""
+    db.query(DockReservation).filter(
+        DockReservation.appointment_id == appointment.id
+    ).delete(synchronize_session=False)
+
+def sync_dock_reservation(appointment: Appointment, db: Session) -> bool:
+    """Bring the ledger in line with the appointment's status, window and dock"""
+    if appointment.status not in ACTIVE_APPOINTMENT_STATUSES or not appointment.dock_id:
+        release_dock(appointment, db)
+        return True
+    return hold_dock(appointment, appointment.dock_id, db)
+
+def assign_available_dock(appointment: Appointment, db: Session,
+                          dock_requirements: Optional[Dict] = None) -> Optional[Dock]:
+    """Reserve the first compatible dock that is free for the appointment's window.
+    Concurrent bookings race on the ledger; the loser retries with the next dock."""
+    docks = db.query(Dock).filter(Dock.location_id == appointment.location_id).order_by(Dock.id).all()
+    compatible = get_dock_capability_index(appointment.location_id, docks).compatible(dock_requirements)
+    available_docks = [
+        dock for pos, dock in enumerate(docks)
+        if compatible >> pos & 1 and dock.status == DockStatusEnum.available
+    ]
     
-    # Sort by score (best first)
-    recommendations.sort(key=lambda x: x.availability_score, reverse=True)
+    if not available_docks:
+        return None
     
-    return recommendations[:20]  # Return top 20 recommendations
+    # Reserved docks for every candidate in one query
+    busy = {
+        dock_id for (dock_id,) in db.query(DockReservation.dock_id).filter(
+            DockReservation.dock_id.in_([dock.id for dock in available_docks]),
+            DockReservation.period.overlaps(
+                Range(appointment.window_start, appointment.window_end, bounds="[)")
+            )
+        ).all()
+    }
+    
+    for dock in available_docks:
+        if dock.id not in busy and hold_dock(appointment, dock.id, db):
+            return dock
+    
+    return None
 
 async def auto_assign_dock(appointment_id: str, db: Session) -> Optional[str]:
     """Automatically assign the best available dock to an appointment"""
@@ -313,44 +1084,432 @@ async def auto_assign_dock(appointment_id: str, db: Session) -> Optional[str]:
     if not appointment or appointment.dock_id:
         return None
     
-    # Get available docks at the location
-    available_docks = db.query(Dock).filter(
-        Dock.location_id == appointment.location_id,
-        Dock.status == DockStatusEnum.available
-    ).all()
-    
-    if not available_docks:
+    dock = assign_available_dock(appointment, db, appointment.dock_requirements)
+    if not dock:
         return None
     
-    # Check for conflicts at appointment time
-    best_dock = None
-    min_conflicts = float('inf')
+    db.commit()
+    availability_grid.apply_appointment(appointment)
+    return str(dock.id)
+
+def plan_dock_assignments(appointments: List[Appointment], docks: List[Dock],
+                          assigned_appointments: List[Appointment],
+                          index: DockCapabilityIndex) -> Dict[Any, Dock]:
+    """Greedy interval scheduling: place appointments by earliest end on the
+    conflict-free compatible dock that leaves the smallest idle gap before them.
+    Appointments with no free compatible dock are left out of the plan."""
+    timelines = build_dock_timelines(docks, assigned_appointments)
+    available = sum(
+        1 << pos for pos, dock in enumerate(docks) if dock.status == DockStatusEnum.available
+    )
+    plan: Dict[Any, Dock] = {}
+    
+    for appt in sorted(appointments, key=lambda a: (a.window_end, a.window_start)):
+        best_dock = None
+        best_gap = None
+        for pos in iter_bits(index.compatible(appt.dock_requirements) & available):
+            dock = docks[pos]
+            timeline = timelines[dock.id]
+            if timeline.overlapping(appt.window_start, appt.window_end):
+                continue
+            latest_end = timeline.latest_end_before(appt.window_start)
+            gap = appt.window_start - latest_end if latest_end else timedelta.max
+            if best_gap is None or gap < best_gap:
+                best_gap = gap
+                best_dock = dock
+        
+        if best_dock:
+            plan[appt.id] = best_dock
+            timelines[best_dock.id].add(appt)
     
-    for dock in available_docks:
-        # Count conflicting appointments
-        conflicts = db.query(Appointment).filter(
-            Appointment.dock_id == dock.id,
-            Appointment.window_start < appointment.window_end,
-            Appointment.window_end > appointment.window_start,
-            Appointment.status.in_([
-                AppointmentStatusEnum.scheduled,
-                AppointmentStatusEnum.arriving,
-                AppointmentStatusEnum.arrived,
-                AppointmentStatusEnum.at_dock,
-                AppointmentStatusEnum.loading
-            ])
-        ).count()
-        
-        if conflicts < min_conflicts:
-            min_conflicts = conflicts
-            best_dock = dock
-    
-    if best_dock and min_conflicts == 0:  # No conflicts
-        appointment.dock_id = best_dock.id
+    return plan
+
+def assign_docks_in_bulk(location_id: str, db: Session,
+                         appointment_ids: Optional[List[Any]] = None,
+                         start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None) -> Tuple[List[Appointment], Dict[Any, Dock]]:
+    """Plan and reserve docks for a location's unassigned appointments in one pass"""
+    query = db.query(Appointment).filter(
+        Appointment.location_id == location_id,
+        Appointment.dock_id.is_(None),
+        Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+    )
+    
+    if appointment_ids:
+        query = query.filter(Appointment.id.in_(appointment_ids))
+    
+    if start_date:
+        query = query.filter(Appointment.window_end > start_date)
+    
+    if end_date:
+        query = query.filter(Appointment.window_start < end_date)
+    
+    appointments = query.all()
+    
+    # All docks at the location so the capability index matches the cached one
+    docks = db.query(Dock).filter(Dock.location_id == location_id).order_by(Dock.id).all()
+    
+    plan: Dict[Any, Dock] = {}
+    if appointments and docks:
+        # Existing bookings on these docks over the span being planned
+        assigned_appointments = db.query(Appointment).filter(
+            Appointment.dock_id.in_([dock.id for dock in docks]),
+            Appointment.window_start < max(appt.window_end for appt in appointments),
+            Appointment.window_end > min(appt.window_start for appt in appointments),
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+        ).all()
+        
+        index = get_dock_capability_index(location_id, docks)
+        plan = plan_dock_assignments(appointments, docks, assigned_appointments, index)
+        
+        # Another booking may have taken a planned dock since it was read
+        for appt in appointments:
+            if appt.id in plan and not hold_dock(appt, plan[appt.id].id, db):
+                del plan[appt.id]
         db.commit()
-        return str(best_dock.id)
     
-    return None
+    if appointments:
+        availability_grid.invalidate_location(location_id)
+    
+    return appointments, plan
+
+# Appointment listings
+MAX_APPOINTMENT_PAGE_SIZE = 1000  # Larger limits are clamped; follow X-Next-Cursor for the rest
+APPOINTMENT_LIST_COLUMNS = [
+    Appointment.id, Appointment.location_id, Appointment.carrier_id, Appointment.po,
+    Appointment.ref_no, Appointment.window_start, Appointment.window_end,
+    Appointment.status, Appointment.priority, Appointment.dock_id, Appointment.created_at
+]
+
+def encode_appointment_cursor(window_start: datetime, appointment_id: Any) -> str:
+    raw = json.dumps([window_start.isoformat(), str(appointment_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_appointment_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of encode_appointment_cursor; raises ValueError on anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        window_start, appointment_id = json.loads(raw)
+        return datetime.fromisoformat(window_start), uuid.UUID(appointment_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+def list_appointments(db: Session, location_id: Optional[str] = None,
+                      carrier_id: Optional[str] = None,
+                      status: Optional[AppointmentStatusEnum] = None,
+                      start_date: Optional[datetime] = None,
+                      end_date: Optional[datetime] = None, limit: int = 100,
+                      after: Optional[Tuple[datetime, Any]] = None) -> Tuple[List[Any], Optional[str]]:
+    """One page of appointment rows (plain column tuples, no ORM objects) in
+    (window_start, id) order, plus the cursor for the next page"""
+    query = db.query(*APPOINTMENT_LIST_COLUMNS)
+    
+    if location_id:
+        query = query.filter(Appointment.location_id == location_id)
+    
+    if carrier_id:
+        query = query.filter(Appointment.carrier_id == carrier_id)
+    
+    if status:
+        query = query.filter(Appointment.status == status)
+    
+    if start_date:
+        query = query.filter(Appointment.window_start >= start_date)
+    
+    if end_date:
+        query = query.filter(Appointment.window_end <= end_date)
+    
+    # Seek past the previous page instead of OFFSET so deep pages cost the same
+    if after:
+        query = query.filter(tuple_(Appointment.window_start, Appointment.id) > tuple_(*after))
+    
+    rows = query.order_by(Appointment.window_start, Appointment.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_appointment_cursor(rows[-1].window_start, rows[-1].id)
+    return rows, next_cursor
+
+# Bulk import and export
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+EXPORT_BATCH_SIZE = 1000
+APPOINTMENT_EXPORT_COLUMNS = [
+    "id", "location_id", "carrier_id", "po", "ref_no", "window_start", "window_end",
+    "status", "priority", "dock_id", "dock_requirements", "created_by", "created_at"
+]
+
+async def iter_body_lines(request: Request):
+    """Yield the request body line by line, endings included, as it streams in"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if buffer:
+        yield buffer
+
+async def iter_body_records(request: Request, fmt: str):
+    """Yield the body one record at a time: a line, or for CSV every line a quoted field spans"""
+    record = b""
+    async for line in iter_body_lines(request):
+        record += line
+        # Quotes inside quoted fields are doubled, so an odd count means the field continues
+        if fmt == "csv" and record.count(b'"') % 2:
+            continue
+        yield record
+        record = b""
+    if record:
+        yield record
+
+def parse_import_row(row: Dict[str, Any]) -> AppointmentCreate:
+    """Validate one import row; CSV cells arrive as strings"""
+    row = {key: value for key, value in row.items() if value not in ("", None)}
+    if isinstance(row.get("dock_requirements"), str):
+        row["dock_requirements"] = json.loads(row["dock_requirements"])
+    appointment = AppointmentCreate.model_validate(row)
+    appointment.location_id = str(uuid.UUID(appointment.location_id))
+    appointment.carrier_id = str(uuid.UUID(appointment.carrier_id))
+    if appointment.window_end <= appointment.window_start:
+        raise ValueError("window_end must be after window_start")
+    return appointment
+
+async def iter_import_rows(request: Request, fmt: str):
+    """Yield (row number, AppointmentCreate or None, error or None) per data row"""
+    header = None
+    row_no = 0
+    async for record in iter_body_records(request, fmt):
+        if header is None and record.startswith(codecs.BOM_UTF8):
+            record = record[len(codecs.BOM_UTF8):]
+        if not record.strip():
+            continue
+        
+        try:
+            line = record.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if fmt == "csv" and header is None:
+                raise HTTPException(status_code=400, detail=f"CSV header is not valid UTF-8: {str(e)}")
+            row_no += 1
+            yield row_no, None, f"Row is not valid UTF-8: {str(e)}"
+            continue
+        
+        if fmt == "csv":
+            values = next(csv.reader(io.StringIO(line)))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_no += 1
+            row = dict(zip(header, values))
+        else:
+            row_no += 1
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_no, None, f"Invalid JSON: {str(e)}"
+                continue
+        
+        try:
+            yield row_no, parse_import_row(row), None
+        except ValidationError as e:
+            yield row_no, None, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            yield row_no, None, str(e)
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def iter_export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(APPOINTMENT_EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([
+            json.dumps(value) if isinstance(value, (dict, list)) else export_value(value)
+            for value in row
+        ])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_export_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({
+            column: export_value(value)
+            for column, value in zip(APPOINTMENT_EXPORT_COLUMNS, row)
+        }) + "\n")
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+def create_indexes_concurrently(table):
+    """Build the table's missing indexes without blocking writes, rebuilding any an interrupted build left invalid"""
+    # CONCURRENTLY cannot run inside a transaction and keeps writes flowing on large tables
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in table.indexes:
+            valid = conn.execute(
+                text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": index.name}
+            ).scalar()
+            if valid is False:
+                logger.warning(f"Rebuilding invalid index {index.name}")
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            if not valid:
+                index.create(bind=conn)
+
+@app.on_event("startup")
+def ensure_reservation_ledger():
+    """Add columns and the dock reservation ledger, backfilling it from assigned appointments"""
+    # Every Appointment query selects this column, so it must not depend on the ledger setup succeeding
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE appointments ADD COLUMN IF NOT EXISTS dock_requirements JSON"))
+    except Exception as e:
+        logger.error(f"Failed to add appointment columns: {str(e)}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            DockReservation.__table__.create(bind=conn, checkfirst=True)
+            # Appointments already double-booked keep only the first hold
+            conn.execute(
+                pg_insert(DockReservation).from_select(
+                    ["appointment_id", "dock_id", "period", "created_at"],
+                    select(
+                        Appointment.id, Appointment.dock_id,
+                        func.tsrange(Appointment.window_start, Appointment.window_end),
+                        func.now()
+                    ).where(
+                        Appointment.dock_id.isnot(None),
+                        Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+                    ).order_by(Appointment.created_at)
+                ).on_conflict_do_nothing()
+            )
+    except Exception as e:
+        logger.error(f"Failed to prepare dock reservation ledger: {str(e)}")
+    
+    try:
+        create_indexes_concurrently(Appointment.__table__)
+    except Exception as e:
+        logger.error(f"Failed to create appointment indexes: {str(e)}")
+
+def optimize_dock_schedule(appointments: List[Appointment], docks: List[Dock],
+                           eligible: Dict[Any, int],
+                           fixed_appointments: List[Appointment]) -> Tuple[Dict[Any, Dock], Set[Any]]:
+    """Plan docks for a day's appointments, returning (plan, kept).
+    
+    eligible maps appointment id to a bitmap over docks it may use. Appointments
+    already at a dock stay there and fixed_appointments are treated as busy time.
+    The rest are placed in start order on a free eligible dock, preferring their
+    current dock, then the dock the fewest appointments can use, then the
+    smallest idle gap. When every eligible dock is taken, one lower-priority
+    appointment may be bumped; bumped appointments get one more pass at the end.
+    
+    Docks that another appointment validly holds at that time are avoided
+    while there is a choice. An appointment left unplaced whose current dock
+    is still free keeps it; kept holds those ids, which are not in the plan.
+    """
+    dock_pos = {dock.id: pos for pos, dock in enumerate(docks)}
+    timelines = build_dock_timelines(docks, fixed_appointments)
+    
+    # How many appointments could use each dock, to keep versatile docks free
+    demand = [0] * len(docks)
+    for mask in eligible.values():
+        for pos in iter_bits(mask):
+            demand[pos] += 1
+    
+    plan: Dict[Any, Dock] = {}
+    pinned: Set[Any] = set()
+    for appt in appointments:
+        if appt.status in RUNNING_APPOINTMENT_STATUSES and appt.dock_id in dock_pos:
+            plan[appt.id] = docks[dock_pos[appt.dock_id]]
+            pinned.add(appt.id)
+            timelines[appt.dock_id].add(appt)
+    
+    # Current assignments that are eligible and conflict-free, first come first served
+    holds = build_dock_timelines(docks, [])
+    for appt in sorted(appointments, key=lambda a: a.window_start):
+        pos = dock_pos.get(appt.dock_id)
+        if (appt.id not in pinned and pos is not None and eligible.get(appt.id, 0) >> pos & 1 and
+                not timelines[appt.dock_id].overlapping(appt.window_start, appt.window_end) and
+                not holds[appt.dock_id].overlapping(appt.window_start, appt.window_end)):
+            holds[appt.dock_id].add(appt)
+    
+    def encroaches(appt: Appointment, pos: int) -> bool:
+        """Whether pos is held at appt's time by another appointment not yet placed"""
+        return any(
+            other.id != appt.id and other.id not in plan
+            for other in holds[docks[pos].id].overlapping(appt.window_start, appt.window_end)
+        )
+    
+    def idle_gap(appt: Appointment, pos: int) -> timedelta:
+        latest_end = timelines[docks[pos].id].latest_end_before(appt.window_start)
+        return appt.window_start - latest_end if latest_end else timedelta.max
+    
+    def place(appt: Appointment, allow_bump: bool) -> Optional[Appointment]:
+        """Place appt, returning the appointment it bumped, if any"""
+        free = []
+        bumpable = []
+        for pos in iter_bits(eligible.get(appt.id, 0)):
+            conflicts = timelines[docks[pos].id].overlapping(appt.window_start, appt.window_end)
+            if not conflicts:
+                free.append(pos)
+            elif (allow_bump and len(conflicts) == 1 and conflicts[0].id in plan and
+                  conflicts[0].id not in pinned and
+                  (conflicts[0].priority or 0) < (appt.priority or 0)):
+                bumpable.append(((conflicts[0].priority or 0), demand[pos], pos, conflicts[0]))
+        
+        victim = None
+        if free:
+            pos = min(free, key=lambda p: (
+                docks[p].id != appt.dock_id, encroaches(appt, p), demand[p], idle_gap(appt, p)
+            ))
+        elif bumpable:
+            _, _, pos, victim = min(bumpable, key=lambda b: b[:3])
+            timelines[docks[pos].id].remove(victim)
+            del plan[victim.id]
+        else:
+            return None
+        
+        plan[appt.id] = docks[pos]
+        timelines[docks[pos].id].add(appt)
+        return victim
+    
+    bumped = []
+    movable = sorted(
+        (appt for appt in appointments if appt.id not in pinned),
+        key=lambda a: (a.window_start, -(a.priority or 0))
+    )
+    for appt in movable:
+        victim = place(appt, allow_bump=True)
+        if victim:
+            bumped.append(victim)
+    
+    for appt in sorted(bumped, key=lambda a: a.window_start):
+        place(appt, allow_bump=False)
+    
+    # An appointment that could not be re-placed keeps a valid current dock that is still free
+    kept: Set[Any] = set()
+    for appt in movable:
+        if (appt.id not in plan and appt.dock_id in dock_pos and
+                eligible.get(appt.id, 0) >> dock_pos[appt.dock_id] & 1 and
+                not timelines[appt.dock_id].overlapping(appt.window_start, appt.window_end)):
+            kept.add(appt.id)
+            timelines[appt.dock_id].add(appt)
+    
+    return plan, kept
 
 # API Endpoints
 @app.get("/health")
@@ -360,11 +1519,14 @@ async def health_check():
 @app.post("/api/appointments")
 async def create_appointment(
     request: AppointmentCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Create a new appointment"""
     try:
+        # The ledger stores the window as a range, which cannot end before it starts
+        if request.window_end <= request.window_start:
+            raise HTTPException(status_code=400, detail="window_end must be after window_start")
+        
         # Validate location exists
         location = db.query(Location).filter(Location.id == request.location_id).first()
         if not location:
@@ -379,15 +1541,19 @@ async def create_appointment(
             window_start=request.window_start,
             window_end=request.window_end,
             priority=request.priority,
+            dock_requirements=request.dock_requirements,
             created_by=request.created_by
         )
         
         db.add(appointment)
+        db.flush()
+        
+        # Book a dock in the same transaction so concurrent bookings cannot share one
+        assign_available_dock(appointment, db, request.dock_requirements)
+        
         db.commit()
         db.refresh(appointment)
-        
-        # Try to auto-assign dock
-        background_tasks.add_task(auto_assign_dock, str(appointment.id), db)
+        availability_grid.apply_appointment(appointment)
         
         return {
             "message": "Appointment created successfully",
@@ -407,21 +1573,190 @@ async def create_appointment(
             }
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create appointment: {str(e)}")
 
 @app.get("/api/appointments")
 async def get_appointments(
+    response: Response,
     location_id: Optional[str] = None,
     carrier_id: Optional[str] = None,
     status: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get appointments with filters, one page at a time.
+    
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    limit = min(max(limit, 1), MAX_APPOINTMENT_PAGE_SIZE)
+    try:
+        after = decode_appointment_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    rows, next_cursor = list_appointments(
+        db, location_id=location_id, carrier_id=carrier_id,
+        status=AppointmentStatusEnum(status) if status else None,
+        start_date=start_date, end_date=end_date, limit=limit, after=after
+    )
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return [
+        {
+            "id": str(row.id),
+            "location_id": str(row.location_id),
+            "carrier_id": str(row.carrier_id),
+            "po": row.po,
+            "ref_no": row.ref_no,
+            "window_start": row.window_start,
+            "window_end": row.window_end,
+            "status": row.status.value,
+            "priority": row.priority,
+            "dock_id": str(row.dock_id) if row.dock_id else None,
+            "created_at": row.created_at
+        } for row in rows
+    ]
+
+@app.post("/api/appointments/auto-assign")
+async def bulk_auto_assign_docks(
+    request: BulkAutoAssignRequest,
+    db: Session = Depends(get_db)
+):
+    """Assign docks to many unassigned appointments at a location in one pass"""
+    try:
+        appointments, plan = assign_docks_in_bulk(
+            request.location_id, db, request.appointment_ids,
+            request.start_date, request.end_date
+        )
+        
+        return {
+            "message": f"Assigned docks to {len(plan)} of {len(appointments)} appointments",
+            "assigned": [
+                {
+                    "appointment_id": str(appt.id),
+                    "dock_id": str(plan[appt.id].id),
+                    "dock_door_no": plan[appt.id].door_no
+                } for appt in appointments if appt.id in plan
+            ],
+            "unassigned": [str(appt.id) for appt in appointments if appt.id not in plan]
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to auto-assign docks: {str(e)}")
+
+@app.post("/api/appointments/import")
+async def import_appointments(
+    request: Request,
+    format: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get appointments with filters"""
-    query = db.query(Appointment)
+    """Bulk-create appointments from a streamed CSV or NDJSON body.
+    
+    Rows are validated one by one and inserted in chunks; docks are assigned
+    in one batch per location once everything is in.
+    """
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    errors: List[Dict[str, Any]] = []
+    known_locations: Dict[Any, bool] = {}
+    imported: Dict[Any, List[Any]] = {}  # location_id -> appointment ids
+    chunk: List[Tuple[int, AppointmentCreate]] = []
+    
+    def flush_chunk():
+        # Validate each location once for the whole import
+        unseen = {row.location_id for _, row in chunk} - known_locations.keys()
+        if unseen:
+            found = {
+                str(location_id) for (location_id,) in
+                db.query(Location.id).filter(Location.id.in_(unseen)).all()
+            }
+            known_locations.update({location_id: location_id in found for location_id in unseen})
+        
+        values = []
+        value_rows = []
+        for row_no, row in chunk:
+            if not known_locations[row.location_id]:
+                errors.append({"row": row_no, "error": "Location not found"})
+                continue
+            value_rows.append(row_no)
+            values.append({
+                "id": uuid.uuid4(),
+                "location_id": row.location_id,
+                "carrier_id": row.carrier_id,
+                "po": row.po,
+                "ref_no": row.ref_no,
+                "window_start": row.window_start,
+                "window_end": row.window_end,
+                "priority": row.priority,
+                "dock_requirements": row.dock_requirements,
+                "created_by": row.created_by
+            })
+        
+        if values:
+            try:
+                db.execute(insert(Appointment), values)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                errors.extend({"row": row_no, "error": f"Insert failed: {str(e)}"} for row_no in value_rows)
+                values = []
+        
+        for value in values:
+            imported.setdefault(value["location_id"], []).append(value["id"])
+        chunk.clear()
+    
+    async for row_no, row, error in iter_import_rows(request, fmt):
+        if error:
+            errors.append({"row": row_no, "error": error})
+            continue
+        chunk.append((row_no, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush_chunk()
+    if chunk:
+        flush_chunk()
+    
+    docks_assigned = 0
+    for location_id, appointment_ids in imported.items():
+        try:
+            _, plan = assign_docks_in_bulk(location_id, db, appointment_ids)
+            docks_assigned += len(plan)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Dock assignment after import failed for {location_id}: {str(e)}")
+    
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "message": "Appointments imported",
+        "imported": sum(len(ids) for ids in imported.values()),
+        "failed": len({error["row"] for error in errors}),
+        "docks_assigned": docks_assigned,
+        "errors": errors
+    }
+
+@app.get("/api/appointments/export")
+async def export_appointments(
+    location_id: Optional[str] = None,
+    carrier_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    format: str = "csv",
+    db: Session = Depends(get_db)
+):
+    """Stream appointments as CSV or NDJSON in the import format"""
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    query = db.query(*[getattr(Appointment, column) for column in APPOINTMENT_EXPORT_COLUMNS])
     
     if location_id:
         query = query.filter(Appointment.location_id == location_id)
@@ -429,32 +1764,20 @@ async def get_appointments(
     if carrier_id:
         query = query.filter(Appointment.carrier_id == carrier_id)
     
-    if status:
-        query = query.filter(Appointment.status == AppointmentStatusEnum(status))
-    
     if start_date:
         query = query.filter(Appointment.window_start >= start_date)
     
     if end_date:
         query = query.filter(Appointment.window_end <= end_date)
     
-    appointments = query.order_by(Appointment.window_start).limit(limit).all()
+    rows = query.order_by(Appointment.window_start).yield_per(EXPORT_BATCH_SIZE)
     
-    return [
-        {
-            "id": str(appt.id),
-            "location_id": str(appt.location_id),
-            "carrier_id": str(appt.carrier_id),
-            "po": appt.po,
-            "ref_no": appt.ref_no,
-            "window_start": appt.window_start,
-            "window_end": appt.window_end,
-            "status": appt.status.value,
-            "priority": appt.priority,
-            "dock_id": str(appt.dock_id) if appt.dock_id else None,
-            "created_at": appt.created_at
-        } for appt in appointments
-    ]
+    if format == "csv":
+        return StreamingResponse(
+            iter_export_csv(rows), media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=appointments.csv"}
+        )
+    return StreamingResponse(iter_export_ndjson(rows), media_type="application/x-ndjson")
 
 @app.put("/api/appointments/{appointment_id}")
 async def update_appointment(
@@ -487,13 +1810,23 @@ async def update_appointment(
         if request.dock_id:
             appointment.dock_id = request.dock_id
         
+        if appointment.window_end <= appointment.window_start:
+            raise HTTPException(status_code=400, detail="window_end must be after window_start")
+        
+        if not sync_dock_reservation(appointment, db):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Dock is already reserved for that window")
+        
         db.commit()
+        availability_grid.apply_appointment(appointment)
         
         return {
             "message": "Appointment updated successfully",
             "appointment_id": appointment_id
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update appointment: {str(e)}")
 
@@ -531,6 +1864,133 @@ async def check_slot_availability(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to check availability: {str(e)}")
 
+@app.post("/api/slots/grid/{location_id}/check")
+async def check_availability_grid(
+    location_id: str,
+    db: Session = Depends(get_db)
+):
+    """Compare a location's materialized availability with the database and repair stale days"""
+    try:
+        stale_days = availability_grid.check(location_id, db)
+        
+        return {
+            "location_id": location_id,
+            "materialized_days": len(availability_grid.by_location.get(location_id, ())),
+            "stale_days": [day.date().isoformat() for day in stale_days]
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to check availability grid: {str(e)}")
+
+@app.post("/api/slot-rules")
+async def create_slot_rule(
+    request: SlotRuleCreate,
+    db: Session = Depends(get_db)
+):
+    """Create a slot rule for a location"""
+    try:
+        rule = SlotRule(
+            location_id=request.location_id,
+            dock_group=request.dock_group,
+            capacity_per_slot=request.capacity_per_slot,
+            slot_minutes=request.slot_minutes,
+            windows=request.windows
+        )
+        
+        db.add(rule)
+        db.commit()
+        db.refresh(rule)
+        invalidate_location_schedule(rule.location_id)
+        availability_grid.invalidate_location(rule.location_id)
+        
+        return {
+            "message": "Slot rule created successfully",
+            "slot_rule_id": str(rule.id)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create slot rule: {str(e)}")
+
+@app.get("/api/slot-rules")
+async def get_slot_rules(
+    location_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get slot rules, optionally for one location"""
+    query = db.query(SlotRule)
+    
+    if location_id:
+        query = query.filter(SlotRule.location_id == location_id)
+    
+    rules = query.order_by(SlotRule.created_at).all()
+    
+    return [
+        {
+            "id": str(rule.id),
+            "location_id": str(rule.location_id),
+            "dock_group": rule.dock_group,
+            "capacity_per_slot": rule.capacity_per_slot,
+            "slot_minutes": rule.slot_minutes,
+            "windows": rule.windows,
+            "created_at": rule.created_at
+        } for rule in rules
+    ]
+
+@app.put("/api/slot-rules/{rule_id}")
+async def update_slot_rule(
+    rule_id: str,
+    request: SlotRuleUpdate,
+    db: Session = Depends(get_db)
+):
+    """Update a slot rule"""
+    rule = db.query(SlotRule).filter(SlotRule.id == rule_id).first()
+    
+    if not rule:
+        raise HTTPException(status_code=404, detail="Slot rule not found")
+    
+    if request.dock_group is not None:
+        rule.dock_group = request.dock_group
+    
+    if request.capacity_per_slot is not None:
+        rule.capacity_per_slot = request.capacity_per_slot
+    
+    if request.slot_minutes is not None:
+        rule.slot_minutes = request.slot_minutes
+    
+    if request.windows is not None:
+        rule.windows = request.windows
+    
+    db.commit()
+    invalidate_location_schedule(rule.location_id)
+    availability_grid.invalidate_location(rule.location_id)
+    
+    return {
+        "message": "Slot rule updated successfully",
+        "slot_rule_id": rule_id
+    }
+
+@app.delete("/api/slot-rules/{rule_id}")
+async def delete_slot_rule(
+    rule_id: str,
+    db: Session = Depends(get_db)
+):
+    """Delete a slot rule"""
+    rule = db.query(SlotRule).filter(SlotRule.id == rule_id).first()
+    
+    if not rule:
+        raise HTTPException(status_code=404, detail="Slot rule not found")
+    
+    location_id = rule.location_id
+    db.delete(rule)
+    db.commit()
+    invalidate_location_schedule(location_id)
+    availability_grid.invalidate_location(location_id)
+    
+    return {
+        "message": "Slot rule deleted successfully",
+        "slot_rule_id": rule_id
+    }
+
 @app.post("/api/docks")
 async def create_dock(
     request: DockCreate,
@@ -556,6 +2016,8 @@ async def create_dock(
         db.add(dock)
         db.commit()
         db.refresh(dock)
+        invalidate_dock_capabilities(dock.location_id)
+        availability_grid.invalidate_location(dock.location_id)
         
         return {
             "message": "Dock created successfully",
@@ -622,6 +2084,8 @@ async def update_dock(
         
         dock.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_dock_capabilities(dock.location_id)
+        availability_grid.invalidate_location(dock.location_id)
         
         return {
             "message": "Dock updated successfully",
@@ -631,6 +2095,105 @@ async def update_dock(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update dock: {str(e)}")
 
+@app.post("/api/docks/optimize")
+async def optimize_docks(
+    request: DockOptimizeRequest,
+    db: Session = Depends(get_db)
+):
+    """Re-plan dock assignments for a location's day; dry_run only returns the plan"""
+    try:
+        day_start = request.date.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = day_start + timedelta(days=1)
+        
+        appointments = db.query(Appointment).filter(
+            Appointment.location_id == request.location_id,
+            Appointment.window_start < day_end,
+            Appointment.window_end > day_start,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+        ).all()
+        
+        docks = db.query(Dock).filter(Dock.location_id == request.location_id).order_by(Dock.id).all()
+        index = get_dock_capability_index(request.location_id, docks)
+        available = sum(
+            1 << pos for pos, dock in enumerate(docks) if dock.status == DockStatusEnum.available
+        )
+        eligible = {
+            appt.id: index.compatible(appt.dock_requirements) & available
+            for appt in appointments
+        }
+        
+        # Bookings outside the day that share docks with it stay as they are
+        fixed_appointments = []
+        if appointments and docks:
+            planned_ids = {appt.id for appt in appointments}
+            fixed_appointments = [
+                appt for appt in db.query(Appointment).filter(
+                    Appointment.dock_id.in_([dock.id for dock in docks]),
+                    Appointment.window_start < max(appt.window_end for appt in appointments),
+                    Appointment.window_end > min(appt.window_start for appt in appointments),
+                    Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+                ).all() if appt.id not in planned_ids
+            ]
+        
+        started = time.perf_counter()
+        plan, kept = optimize_dock_schedule(appointments, docks, eligible, fixed_appointments)
+        solve_ms = (time.perf_counter() - started) * 1000
+        
+        assignments = [
+            {
+                "appointment_id": str(appt.id),
+                "window_start": appt.window_start,
+                "window_end": appt.window_end,
+                "priority": appt.priority,
+                "current_dock_id": str(appt.dock_id) if appt.dock_id else None,
+                "planned_dock_id": str(plan[appt.id].id) if appt.id in plan else None,
+                "planned_door_no": plan[appt.id].door_no if appt.id in plan else None,
+                "kept_current_dock": appt.id in kept
+            } for appt in sorted(appointments, key=lambda a: a.window_start)
+        ]
+        changes = [
+            appt for appt in appointments
+            if appt.id not in kept and (plan[appt.id].id if appt.id in plan else None) != appt.dock_id
+        ]
+        
+        if changes and not request.dry_run:
+            # Release every moved hold first so swaps between docks never overlap
+            db.query(DockReservation).filter(
+                DockReservation.appointment_id.in_([appt.id for appt in changes])
+            ).delete(synchronize_session=False)
+            for appt in changes:
+                appt.dock_id = plan[appt.id].id if appt.id in plan else None
+                if appt.dock_id:
+                    db.add(DockReservation(
+                        appointment_id=appt.id,
+                        dock_id=appt.dock_id,
+                        period=Range(appt.window_start, appt.window_end, bounds="[)")
+                    ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise HTTPException(status_code=409, detail="Dock schedule changed during optimization, retry")
+            
+            availability_grid.invalidate_location(request.location_id)
+        
+        return {
+            "location_id": request.location_id,
+            "date": day_start.date().isoformat(),
+            "dry_run": request.dry_run,
+            "placed": len(plan),
+            "unplaced": len(appointments) - len(plan),
+            "kept_unplaced": len(kept),
+            "changed": len(changes),
+            "solve_ms": round(solve_ms, 1),
+            "assignments": assignments
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to optimize docks: {str(e)}")
+
 @app.post("/api/appointments/{appointment_id}/assign-dock")
 async def assign_dock_to_appointment(
     appointment_id: str,
@@ -652,8 +2215,12 @@ async def assign_dock_to_appointment(
             if not dock:
                 raise HTTPException(status_code=404, detail="Dock not found")
             
-            appointment.dock_id = dock_id
+            appointment.dock_id = dock.id
+            if not sync_dock_reservation(appointment, db):
+                db.rollback()
+                raise HTTPException(status_code=409, detail="Dock is already reserved for that window")
             db.commit()
+            availability_grid.apply_appointment(appointment)
             
             return {
                 "message": "Dock assigned successfully",
@@ -676,6 +2243,8 @@ async def assign_dock_to_appointment(
             else:
                 raise HTTPException(status_code=409, detail="No suitable dock available")
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to assign dock: {str(e)}")
 
@@ -0,0 +1,69 @@
+"""Fixtures for the appointment-service tests.
+
+The service relies on Postgres features (tsrange, exclusion constraints,
+ON CONFLICT), so the tests run against a real database: point
+TEST_DATABASE_URL at a scratch database and run pytest from this
+service's directory, e.g. `TEST_DATABASE_URL=postgresql://... pytest tests`.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+@pytest.fixture(scope="session")
+def main():
+    """The service module, configured for the test database"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    sys.path.insert(0, SERVICE_DIR)
+    import main
+    # The schema is owned by the deployment's migrations; the reservation
+    # ledger is left to the startup hook since it needs btree_gist. Indexes
+    # are built CONCURRENTLY, which needs autocommit.
+    engine = main.engine.execution_options(isolation_level="AUTOCOMMIT")
+    main.Base.metadata.create_all(engine, tables=[
+        table for table in main.Base.metadata.sorted_tables if table.name != "dock_reservations"
+    ])
+    return main
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def db(main, client):
+    db = main.SessionLocal()
+    yield db
+    db.close()
+
+@pytest.fixture
+def make_location(main, db):
+    """Create a location with the given number of available docks"""
+    def make_location(dock_count: int):
+        location = main.Location(org_id=uuid.uuid4(), name=f"Site {uuid.uuid4().hex[:6]}")
+        db.add(location)
+        db.flush()
+        docks = [main.Dock(location_id=location.id, door_no=f"D{i + 1}") for i in range(dock_count)]
+        db.add_all(docks)
+        db.commit()
+        return location, docks
+    return make_location
+
+@pytest.fixture
+def make_appointment(main, db):
+    def make_appointment(location, window_start, window_end, dock=None):
+        appointment = main.Appointment(
+            location_id=location.id, carrier_id=uuid.uuid4(), window_start=window_start,
+            window_end=window_end, dock_id=dock.id if dock else None, created_by="test"
+        )
+        db.add(appointment)
+        db.commit()
+        return appointment
+    return make_appointment
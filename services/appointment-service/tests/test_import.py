@@ -0,0 +1,47 @@
+import uuid
+from datetime import datetime, timedelta
+
+START = datetime(2030, 6, 3, 8)
+
+def csv_row(location, po="PO-1", start=START):
+    return f"{location.id},{uuid.uuid4()},{po},{start.isoformat()},{(start + timedelta(hours=1)).isoformat()},test\n"
+
+HEADER = "location_id,carrier_id,po,window_start,window_end,created_by\n"
+
+def import_csv(client, body):
+    response = client.post("/api/appointments/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    return response.json()
+
+def test_export_round_trips_through_import(main, client, db, make_location, make_appointment):
+    location, _ = make_location(1)
+    appointment = make_appointment(location, START, START + timedelta(hours=1))
+    appointment.po = 'PO "7"\nsecond line, with comma'
+    db.commit()
+    
+    exported = client.get("/api/appointments/export", params={"location_id": str(location.id)})
+    assert exported.status_code == 200
+    result = import_csv(client, exported.content)
+    assert result["imported"] == 1 and result["errors"] == []
+    
+    pos = [po for (po,) in db.query(main.Appointment.po).filter(main.Appointment.location_id == location.id)]
+    assert pos == [appointment.po, appointment.po]
+
+def test_undecodable_row_is_reported_and_the_rest_imported(client, make_location):
+    location, _ = make_location(1)
+    body = (HEADER + csv_row(location)).encode() + csv_row(location, po="PO-\xff").encode("latin-1") \
+        + csv_row(location).encode()
+    result = import_csv(client, body)
+    assert result["imported"] == 2
+    assert [error["row"] for error in result["errors"]] == [2]
+    assert "UTF-8" in result["errors"][0]["error"]
+
+def test_failed_chunk_reports_each_row_once(client, make_location):
+    location, _ = make_location(1)
+    missing = uuid.uuid4()
+    body = HEADER + csv_row(location, po="x" * 500) + csv_row(location).replace(str(location.id), str(missing), 1)
+    result = import_csv(client, body)
+    assert result["imported"] == 0
+    assert sorted((error["row"], error["error"].split(":")[0]) for error in result["errors"]) == [
+        (1, "Insert failed"), (2, "Location not found")
+    ]
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+START = datetime(2030, 7, 1, 8)
+
+def test_oversized_limit_is_clamped(client, make_location, make_appointment):
+    location, _ = make_location(1)
+    for hour in range(3):
+        make_appointment(location, START + timedelta(hours=hour), START + timedelta(hours=hour + 1))
+    response = client.get("/api/appointments", params={"location_id": str(location.id), "limit": 5000})
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    
+    response = client.get("/api/appointments", params={"location_id": str(location.id), "limit": 0})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+def test_invalid_index_is_rebuilt(main, client):
+    index = "ix_appointments_carrier_window"
+    query = text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)")
+    with main.engine.begin() as conn:
+        # What an interrupted CREATE INDEX CONCURRENTLY leaves behind
+        conn.execute(text("UPDATE pg_index SET indisvalid = false WHERE indexrelid = to_regclass(:name)"), {"name": index})
+    
+    main.create_indexes_concurrently(main.Appointment.__table__)
+    
+    with main.engine.connect() as conn:
+        assert conn.execute(query, {"name": index}).scalar() is True
@@ -0,0 +1,65 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect
+
+START = datetime(2030, 5, 6, 9)
+
+@pytest.fixture
+def ledger(main, client):
+    # The ledger's exclusion constraint needs btree_gist, which the startup hook installs when it can
+    if not inspect(main.engine).has_table("dock_reservations"):
+        pytest.skip("dock_reservations was not created (btree_gist unavailable)")
+
+def test_inverted_window_is_rejected_on_create(client, make_location):
+    location, _ = make_location(1)
+    response = client.post("/api/appointments", json={
+        "location_id": str(location.id), "carrier_id": str(uuid.uuid4()),
+        "window_start": START.isoformat(), "window_end": (START - timedelta(hours=1)).isoformat(),
+        "created_by": "test"
+    })
+    assert response.status_code == 400
+
+def test_inverted_window_is_rejected_on_update(client, make_location, make_appointment):
+    location, _ = make_location(1)
+    appointment = make_appointment(location, START, START + timedelta(hours=1))
+    response = client.put(f"/api/appointments/{appointment.id}", json={"window_end": START.isoformat()})
+    assert response.status_code == 400
+
+def test_overlapping_holds_on_one_dock_admit_one(main, ledger, make_location, make_appointment):
+    location, (dock,) = make_location(1)
+    appointments = [
+        make_appointment(location, START, START + timedelta(hours=1)),
+        make_appointment(location, START + timedelta(minutes=30), START + timedelta(hours=2)),
+    ]
+    barrier = threading.Barrier(len(appointments))
+    results = []
+    
+    def book(appointment_id):
+        db = main.SessionLocal()
+        try:
+            appointment = db.get(main.Appointment, appointment_id)
+            barrier.wait()
+            held = main.hold_dock(appointment, dock.id, db)
+            db.commit()
+            results.append(held)
+        finally:
+            db.close()
+    
+    threads = [threading.Thread(target=book, args=(appointment.id,)) for appointment in appointments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    
+    assert sorted(results) == [False, True]
+
+def test_back_to_back_holds_on_one_dock_both_succeed(main, ledger, db, make_location, make_appointment):
+    location, (dock,) = make_location(1)
+    first = make_appointment(location, START, START + timedelta(hours=1))
+    second = make_appointment(location, START + timedelta(hours=1), START + timedelta(hours=2))
+    assert main.hold_dock(first, dock.id, db)
+    assert main.hold_dock(second, dock.id, db)
+    db.commit()
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+DAY = datetime(2030, 3, 4)  # A Monday
+
+@pytest.fixture
+def site(main, db, make_location):
+    """Three docks open 08:00-17:00 in one-hour slots with the default capacity"""
+    location, docks = make_location(3)
+    db.add(main.SlotRule(location_id=location.id, capacity_per_slot=1, slot_minutes=60,
+                         windows=[{"start": "08:00", "end": "17:00"}]))
+    db.commit()
+    main.invalidate_location_schedule(location.id)
+    return location, docks
+
+def slot_starts(main, db, location, grid: bool):
+    args = (str(location.id), DAY, DAY + timedelta(days=1), 60, None, db)
+    if grid:
+        slots = main.availability_grid.get_available_slots(*args)
+    else:
+        slots = main.get_available_slots(*args)
+    return {slot.slot_start.hour: slot for slot in slots}
+
+@pytest.mark.parametrize("grid", [False, True])
+def test_one_booking_leaves_the_other_docks_bookable(main, db, site, make_appointment, grid):
+    location, docks = site
+    make_appointment(location, DAY.replace(hour=10), DAY.replace(hour=11), docks[0])
+    
+    slots = slot_starts(main, db, location, grid)
+    assert sorted(slots) == list(range(8, 17))
+    assert slots[10].dock_id != str(docks[0].id)
+
+@pytest.mark.parametrize("grid", [False, True])
+def test_slot_closes_once_every_dock_is_booked(main, db, site, make_appointment, grid):
+    location, docks = site
+    for dock in docks:
+        make_appointment(location, DAY.replace(hour=10), DAY.replace(hour=11), dock)
+    
+    slots = slot_starts(main, db, location, grid)
+    assert 10 not in slots
+    assert 9 in slots and 11 in slots
+
+def test_appointment_starting_before_the_range_is_counted(main, db, site, make_appointment):
+    location, docks = site
+    for dock in docks:
+        make_appointment(location, DAY - timedelta(hours=2), DAY.replace(hour=9), dock)
+    
+    slots = slot_starts(main, db, location, grid=False)
+    assert 8 not in slots
+    assert 9 in slots
+
+def test_rule_edits_reach_the_cached_schedule(main, db, site):
+    location, _ = site
+    assert 16 in slot_starts(main, db, location, grid=False)
+    
+    rule = db.query(main.SlotRule).filter(main.SlotRule.location_id == location.id).one()
+    rule.windows = [{"start": "08:00", "end": "12:00"}]
+    db.commit()
+    # Without invalidation the edit shows up after the verify interval
+    assert 16 in slot_starts(main, db, location, grid=False)
+    main.invalidate_location_schedule(location.id)
+    assert max(slot_starts(main, db, location, grid=False)) == 11
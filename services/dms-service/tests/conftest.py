@@ -0,0 +1,33 @@
+"""Fixtures for the dms-service tests.
+
+The blob store relies on Postgres features (advisory locks, ON CONFLICT),
+so the tests run against a real database: point TEST_DATABASE_URL at a
+scratch database and run pytest from this service's directory, e.g.
+`TEST_DATABASE_URL=postgresql://... pytest tests`.
+"""
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_MAX_UPLOAD_BYTES = 256 * 1024
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """The service module, configured for the test database and a scratch blob store"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["BLOB_DIR"] = str(tmp_path_factory.mktemp("blobs"))
+    os.environ["MAX_UPLOAD_BYTES"] = str(TEST_MAX_UPLOAD_BYTES)
+    sys.path.insert(0, SERVICE_DIR)
+    import main
+    return main
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        yield client
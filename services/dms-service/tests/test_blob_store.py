@@ -0,0 +1,132 @@
+import ast
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The blob protocol both services run against the shared volume
+SHARED_BLOB_STORE = [
+    "SHA256_PATTERN", "blob_path", "BLOB_LOCK_NAMESPACE", "lock_blob", "acquire_blob",
+    "reference_blob", "release_blob", "sweep_blob", "sweep_session_blobs",
+    "UPLOAD_FORM_OVERHEAD", "RequestSizeLimit"
+]
+
+def top_level_definitions(service: str):
+    with open(os.path.join(SERVICES_DIR, service, "main.py")) as f:
+        tree = ast.parse(f.read())
+    definitions = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            definitions[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            definitions[node.targets[0].id] = ast.dump(node)
+    return definitions
+
+@pytest.mark.parametrize("name", SHARED_BLOB_STORE)
+def test_blob_store_matches_esign_service(name):
+    dms = top_level_definitions("dms-service")
+    esign = top_level_definitions("esign-service")
+    assert name in dms and name in esign
+    assert dms[name] == esign[name], f"{name} differs between dms-service and esign-service"
+
+def upload(client, content: bytes, filename: str = "bol.pdf"):
+    return client.post("/api/documents/upload", files={"file": (filename, content)}, data={"user_id": 1})
+
+def ref_count(main, sha256: str):
+    db = main.SessionLocal()
+    try:
+        blob = db.get(main.Blob, sha256)
+        return blob.ref_count if blob else None
+    finally:
+        db.close()
+
+def test_duplicate_uploads_share_one_reference_counted_file(main, client):
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    first, second = upload(client, content), upload(client, content)
+    assert first.status_code == 200 and second.status_code == 200
+    assert ref_count(main, sha256) == 2
+    
+    assert client.delete(f"/api/documents/{first.json()['id']}").status_code == 200
+    assert ref_count(main, sha256) == 1
+    assert os.path.exists(main.blob_path(sha256))
+    
+    assert client.delete(f"/api/documents/{second.json()['id']}").status_code == 200
+    assert ref_count(main, sha256) is None
+    assert not os.path.exists(main.blob_path(sha256))
+
+def test_failed_delete_keeps_the_shared_file(main):
+    from fastapi.testclient import TestClient
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        document_id = upload(client, content).json()["id"]
+        db = main.SessionLocal()
+        db.add(main.DocumentVersion(document_id=document_id, version_number=1, file_path="v1",
+                                    file_size=1, created_by=1))
+        db.commit()
+        db.close()
+        
+        # The document_versions foreign key fails the delete at commit
+        assert client.delete(f"/api/documents/{document_id}").status_code == 500
+    assert ref_count(main, sha256) == 1
+    assert os.path.exists(main.blob_path(sha256))
+
+def test_rolled_back_upload_leaves_no_file(main, client):
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    staged = os.path.join(main.BLOB_DIR, "tmp", "rolled-back")
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    with open(staged, "wb") as f:
+        f.write(content)
+    
+    db = main.SessionLocal()
+    main.acquire_blob(db, sha256, len(content), staged)
+    assert os.path.exists(main.blob_path(sha256))
+    db.rollback()
+    db.close()
+    assert ref_count(main, sha256) is None
+    assert not os.path.exists(main.blob_path(sha256))
+
+def test_sweep_waits_for_an_uncommitted_acquire(main):
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    staged = os.path.join(main.BLOB_DIR, "tmp", "racing")
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    with open(staged, "wb") as f:
+        f.write(content)
+    
+    db = main.SessionLocal()
+    main.acquire_blob(db, sha256, len(content), staged)
+    sweeper = threading.Thread(target=main.sweep_blob, args=(sha256,))
+    sweeper.start()
+    time.sleep(0.2)
+    assert sweeper.is_alive(), "sweep must wait for the acquiring transaction"
+    db.commit()
+    db.close()
+    sweeper.join(5)
+    assert os.path.exists(main.blob_path(sha256))
+    assert ref_count(main, sha256) == 1
+
+def test_known_content_skips_the_upload(main, client):
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    form = {"file_hash": sha256, "filename": "copy.pdf", "user_id": 1}
+    assert client.post("/api/documents/by-hash", data=form).status_code == 404
+    
+    upload(client, content)
+    response = client.post("/api/documents/by-hash", data=form)
+    assert response.status_code == 200
+    assert response.json()["file_size"] == len(content)
+    assert ref_count(main, sha256) == 2
+    
+    assert client.post("/api/documents/by-hash", data={**form, "file_hash": "../etc"}).status_code == 400
+
+def test_oversized_upload_is_refused(main, client):
+    response = upload(client, os.urandom(main.MAX_UPLOAD_BYTES + 1))
+    assert response.status_code == 413
+    assert os.listdir(os.path.join(main.BLOB_DIR, "tmp")) == []
@@ -0,0 +1,74 @@
+"""Fixtures for the esign-service tests.
+
+The service relies on Postgres features (advisory locks, ON CONFLICT, row
+locking), so the tests run against a real database: point
+TEST_DATABASE_URL at a scratch database and run pytest from this service's
+directory, e.g. `TEST_DATABASE_URL=postgresql://... pytest tests`.
+"""
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_MAX_UPLOAD_BYTES = 256 * 1024
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """The service module, configured for the test database and a scratch blob store"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["BLOB_DIR"] = str(tmp_path_factory.mktemp("blobs"))
+    os.environ["MAX_UPLOAD_BYTES"] = str(TEST_MAX_UPLOAD_BYTES)
+    os.environ["RENDER_WORKERS"] = "1"
+    sys.path.insert(0, SERVICE_DIR)
+    import main
+    main.Base.metadata.create_all(main.engine)
+    return main
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def pdf_bytes():
+    import fitz
+    document = fitz.open()
+    document.new_page()
+    return document.tobytes()
+
+@pytest.fixture
+def document_id(client, pdf_bytes):
+    """An uploaded one-page document"""
+    response = client.post("/api/documents/upload", files={"file": ("doc.pdf", pdf_bytes)}, data={"uploaded_by": 1})
+    assert response.status_code == 200
+    return response.json()["document_id"]
+
+@pytest.fixture(scope="session")
+def signature_png():
+    import base64
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGBA", (40, 10), (0, 0, 0, 255)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+@pytest.fixture
+def completed_envelope_id(client, document_id, signature_png):
+    """An envelope whose only signer has signed"""
+    envelope_id = client.post(
+        "/api/envelopes/create", params={"created_by": 1},
+        json={"document_id": document_id, "title": "Lease", "recipients": [{"value": "a@example.com", "name": "A"}]}
+    ).json()["envelope_id"]
+    recipient_id = client.get(f"/api/envelopes/{envelope_id}").json()["recipients"][0]["id"]
+    response = client.post(
+        f"/api/envelopes/{envelope_id}/sign", params={"recipient_id": recipient_id},
+        json={"signature_type": "drawn", "signature_data": signature_png,
+              "position_x": 50, "position_y": 50, "page_number": 1}
+    )
+    assert response.json()["envelope_status"] == "completed"
+    return envelope_id
@@ -0,0 +1,42 @@
+import json
+
+def bulk_send(client, body):
+    response = client.post("/api/envelopes/bulk-send", params={"created_by": 1}, json=body)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_messages_are_filled_per_recipient(client, document_id):
+    lines = bulk_send(client, {
+        "document_id": document_id,
+        "title": "Lease for {unit}",
+        "message": "Hi {recipient_name}, please sign for {unit} by {due}.",
+        "envelopes": [{
+            "field_values": {"unit": "4B", "due": "Friday"},
+            "recipients": [
+                {"value": "a@example.com", "name": "Ann"},
+                {"value": "b@example.com", "name": "Bob", "field_values": {"due": "Monday"}},
+            ]
+        }]
+    })
+    assert lines[-1]["created"] == 1
+    envelope_id = lines[0]["results"][0]["envelope_id"]
+    
+    envelope = client.get(f"/api/envelopes/{envelope_id}").json()
+    assert envelope["title"] == "Lease for 4B"
+    assert [r["message"] for r in envelope["recipients"]] == [
+        "Hi Ann, please sign for 4B by Friday.",
+        "Hi Bob, please sign for 4B by Monday.",
+    ]
+
+def test_item_missing_a_value_is_reported(client, document_id):
+    lines = bulk_send(client, {
+        "document_id": document_id,
+        "title": "Lease",
+        "message": "Due {due}",
+        "envelopes": [
+            {"recipients": [{"value": "a@example.com", "name": "Ann", "field_values": {"due": "Friday"}}]},
+            {"recipients": [{"value": "b@example.com", "name": "Bob"}]},
+        ]
+    })
+    assert lines[0]["results"][1] == {"index": 1, "error": "Missing value for due"}
+    assert (lines[-1]["created"], lines[-1]["failed"]) == (1, 1)
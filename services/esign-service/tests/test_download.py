@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+def download(client, envelope_id, **headers):
+    return client.get(f"/api/envelopes/{envelope_id}/download", headers=headers)
+
+def test_download_is_cacheable_by_etag(client, completed_envelope_id):
+    full = download(client, completed_envelope_id)
+    assert full.status_code == 200
+    assert full.headers["accept-ranges"] == "bytes"
+    assert download(client, completed_envelope_id, **{"If-None-Match": full.headers["etag"]}).status_code == 304
+
+def test_satisfiable_ranges_get_partial_content(client, completed_envelope_id):
+    body = download(client, completed_envelope_id).content
+    
+    first = download(client, completed_envelope_id, Range="bytes=0-9")
+    assert first.status_code == 206
+    assert first.content == body[:10]
+    assert first.headers["content-range"] == f"bytes 0-9/{len(body)}"
+    
+    last = download(client, completed_envelope_id, Range="bytes=-5")
+    assert last.status_code == 206 and last.content == body[-5:]
+    
+    tail = download(client, completed_envelope_id, Range=f"bytes={len(body) - 3}-{len(body) + 100}")
+    assert tail.status_code == 206 and tail.content == body[-3:]
+
+@pytest.mark.parametrize("range_header", ["bytes=abc", "items=0-1", "bytes=0-1,3-4", "bytes=9-2", "bytes=-"])
+def test_ranges_we_do_not_serve_are_ignored(client, completed_envelope_id, range_header):
+    response = download(client, completed_envelope_id, Range=range_header)
+    assert response.status_code == 200
+    assert response.content == download(client, completed_envelope_id).content
+
+def test_range_for_another_version_gets_the_whole_file(client, completed_envelope_id):
+    response = download(client, completed_envelope_id, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert response.status_code == 200
+
+def test_range_past_the_end_is_not_satisfiable(client, completed_envelope_id):
+    size = len(download(client, completed_envelope_id).content)
+    for range_header in (f"bytes={size}-", "bytes=-0"):
+        response = download(client, completed_envelope_id, Range=range_header)
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{size}"
+
+def test_missing_signed_file_is_rebuilt(main, client, completed_envelope_id):
+    etag = download(client, completed_envelope_id).headers["etag"]
+    os.remove(main.blob_path(etag.strip('"')))
+    response = download(client, completed_envelope_id)
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+def test_signed_file_that_cannot_be_built_is_not_found(main, client, completed_envelope_id, monkeypatch):
+    etag = download(client, completed_envelope_id).headers["etag"]
+    os.remove(main.blob_path(etag.strip('"')))
+    
+    async def fail(db, envelope):
+        raise FileNotFoundError("source document is gone")
+    monkeypatch.setattr(main, "store_signed_document", fail)
+    assert download(client, completed_envelope_id).status_code == 404
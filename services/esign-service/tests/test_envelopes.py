@@ -0,0 +1,49 @@
+def create_envelope(client, document_id, recipients):
+    response = client.post(
+        "/api/envelopes/create", params={"created_by": 1},
+        json={"document_id": document_id, "title": "Lease", "recipients": recipients}
+    )
+    assert response.status_code == 200
+    envelope_id = response.json()["envelope_id"]
+    return envelope_id, client.get(f"/api/envelopes/{envelope_id}").json()
+
+def sign(client, envelope_id, recipient_id, signature_png):
+    response = client.post(
+        f"/api/envelopes/{envelope_id}/sign", params={"recipient_id": recipient_id},
+        json={"signature_type": "drawn", "signature_data": signature_png,
+              "position_x": 50, "position_y": 50, "page_number": 1}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def test_signing_counts_down_and_completes_the_envelope(client, document_id, signature_png):
+    envelope_id, envelope = create_envelope(client, document_id, [
+        {"value": "a@example.com", "name": "A"},
+        {"value": "b@example.com", "name": "B"},
+        {"value": "c@example.com", "name": "C", "role": "cc"},
+    ])
+    assert envelope["pending_signers"] == 2
+    first, second, cc = envelope["recipients"]
+    
+    assert sign(client, envelope_id, first["id"], signature_png)["envelope_status"] == "created"
+    # A second signature by the same signer does not count again
+    assert sign(client, envelope_id, first["id"], signature_png)["envelope_status"] == "created"
+    assert client.get(f"/api/envelopes/{envelope_id}").json()["pending_signers"] == 1
+    
+    assert sign(client, envelope_id, second["id"], signature_png)["envelope_status"] == "completed"
+    envelope = client.get(f"/api/envelopes/{envelope_id}").json()
+    assert envelope["pending_signers"] == 0
+    assert envelope["status"] == "completed"
+    assert envelope["completed_at"] is not None
+    
+    download = client.get(f"/api/envelopes/{envelope_id}/download")
+    assert download.status_code == 200
+    assert download.content.startswith(b"%PDF")
+
+def test_cc_recipients_do_not_hold_up_completion(client, document_id, signature_png):
+    envelope_id, envelope = create_envelope(client, document_id, [
+        {"value": "a@example.com", "name": "A"},
+        {"value": "c@example.com", "name": "C", "role": "cc"},
+    ])
+    assert envelope["pending_signers"] == 1
+    assert sign(client, envelope_id, envelope["recipients"][0]["id"], signature_png)["envelope_status"] == "completed"
@@ -0,0 +1,59 @@
+import os
+
+def staged_files(main):
+    tmp_dir = os.path.join(main.BLOB_DIR, "tmp")
+    return os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else []
+
+def test_upload_is_stored_once_per_content(main, client, pdf_bytes):
+    first = client.post("/api/documents/upload", files={"file": ("a.pdf", pdf_bytes)}, data={"uploaded_by": 1})
+    second = client.post("/api/documents/upload", files={"file": ("b.pdf", pdf_bytes)}, data={"uploaded_by": 1})
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.json()["file_hash"] == second.json()["file_hash"]
+    assert os.path.exists(main.blob_path(first.json()["file_hash"]))
+    assert staged_files(main) == []
+
+def test_oversized_upload_is_refused_before_it_is_stored(main, client):
+    body = os.urandom(main.MAX_UPLOAD_BYTES + main.UPLOAD_FORM_OVERHEAD + 1)
+    response = client.post("/api/documents/upload", files={"file": ("big.pdf", body)}, data={"uploaded_by": 1})
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Request body exceeds")
+    assert staged_files(main) == []
+
+def test_oversized_upload_without_content_length_is_cut_off(main, client):
+    boundary = "limit-test"
+    chunk = os.urandom(64 * 1024)
+    
+    def body():
+        yield (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"uploaded_by\"\r\n\r\n1\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\n"
+            "Content-Type: application/pdf\r\n\r\n"
+        ).encode()
+        for _ in range((main.MAX_UPLOAD_BYTES + main.UPLOAD_FORM_OVERHEAD) // len(chunk) + 2):
+            yield chunk
+        yield f"\r\n--{boundary}--\r\n".encode()
+    
+    response = client.post(
+        "/api/documents/upload", content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Request body exceeds")
+    assert staged_files(main) == []
+
+def test_file_just_over_the_limit_is_rejected(main, client):
+    body = os.urandom(main.MAX_UPLOAD_BYTES + 1)
+    response = client.post("/api/documents/upload", files={"file": ("big.pdf", body)}, data={"uploaded_by": 1})
+    assert response.status_code == 413
+    assert staged_files(main) == []
+
+def test_known_content_skips_the_upload(main, client, pdf_bytes):
+    import hashlib
+    sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+    client.post("/api/documents/upload", files={"file": ("a.pdf", pdf_bytes)}, data={"uploaded_by": 1})
+    response = client.post("/api/documents/by-hash", data={"file_hash": sha256, "filename": "c.pdf", "uploaded_by": 1})
+    assert response.status_code == 200
+    assert response.json()["file_size"] == len(pdf_bytes)
+    
+    unknown = client.post("/api/documents/by-hash", data={"file_hash": "0" * 64, "filename": "c.pdf", "uploaded_by": 1})
+    assert unknown.status_code == 404
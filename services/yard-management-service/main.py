@@ -1,17 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Header
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, ForeignKey, Float, Integer, JSON, Enum, func
+from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, ForeignKey, Float, Integer, JSON, Enum, Index, BigInteger, Identity, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+from sqlalchemy.exc import OperationalError
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any, Tuple
 import os
 import uuid
 import json
 import enum
 import asyncio
+import fcntl
+import glob
+from collections import deque
 import httpx
 from dotenv import load_dotenv
 import logging
@@ -48,6 +53,8 @@ class EventTypeEnum(enum.Enum):
     depart = "depart"
     doc_signed = "doc_signed"
     exception = "exception"
+    yard_entry = "yard_entry"
+    yard_exit = "yard_exit"
 
 # Database Models
 class Location(Base):
@@ -60,6 +67,7 @@ class Location(Base):
     address = Column(String(500))
     geojson_gate = Column(Text)
     geojson_yard = Column(Text)
+    gate_radius_meters = Column(Float)  # Arrival radius around the gate; GATE_RADIUS_METERS when unset
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Trailer(Base):
@@ -73,7 +81,21 @@ class Trailer(Base):
     last_latitude = Column(Float)
     last_longitude = Column(Float)
     last_seen = Column(DateTime, default=datetime.utcnow)
+    # Denormalized from the open TrailerPosition and the last fix, for search
+    current_location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"))
+    current_zone_id = Column(UUID(as_uuid=True), ForeignKey("yard_zones.id"))
+    current_spot_number = Column(String(50))
+    # Set by dispatch; steer spot choice and jockey move planning
+    assigned_dock_id = Column(UUID(as_uuid=True), ForeignKey("docks.id"))
+    expected_departure = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_trailers_location_seen", "current_location_id", "last_seen", postgresql_concurrently=True),
+        Index("ix_trailers_zone_seen", "current_zone_id", "last_seen", postgresql_concurrently=True),
+        Index("ix_trailers_carrier_seen", "carrier_id", "last_seen", postgresql_concurrently=True),
+        Index("ix_trailers_status_seen", "status", "last_seen", postgresql_concurrently=True),
+    )
 
 class LogisticsEvent(Base):
     __tablename__ = "logistics_events"
@@ -85,6 +107,14 @@ class LogisticsEvent(Base):
     ref_id = Column(UUID(as_uuid=True))
     payload = Column(JSON)  # JSON payload for flexible event data
     at = Column(DateTime, default=datetime.utcnow)
+    seq = Column(BigInteger, Identity(), nullable=False)  # Commit order, see insert_events
+    
+    __table_args__ = (
+        Index("ix_logistics_events_seq", "seq", unique=True, postgresql_concurrently=True),
+        Index("ix_logistics_events_location_seq", "location_id", "seq", postgresql_concurrently=True),
+        # Events are appended roughly in time order, so a BRIN index covers time ranges at a fraction of the size
+        Index("ix_logistics_events_at", "at", postgresql_using="brin", postgresql_concurrently=True),
+    )
 
 class YardZone(Base):
     __tablename__ = "yard_zones"
@@ -95,9 +125,18 @@ class YardZone(Base):
     zone_type = Column(String(50), default="parking")  # parking, staging, loading, etc.
     capacity = Column(Integer, default=10)
     geojson_boundary = Column(Text)  # GeoJSON polygon for zone boundary
-    metadata = Column(JSON)  # Additional zone properties
+    zone_metadata = Column("metadata", JSON)  # Additional zone properties; "metadata" is reserved on declarative models
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Dock(Base):
+    """Docks are owned by appointment-service; the yard only reads them"""
+    __tablename__ = "docks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=False)
+    door_no = Column(String(50), nullable=False)
+    capabilities = Column(JSON)  # {"lat": ..., "lon": ...} places the door in the yard, see DockCreate there
+
 class TrailerPosition(Base):
     __tablename__ = "trailer_positions"
     
@@ -112,6 +151,15 @@ class TrailerPosition(Base):
     entered_at = Column(DateTime, default=datetime.utcnow)
     exited_at = Column(DateTime)
 
+class YardZoneOccupancy(Base):
+    __tablename__ = "yard_zone_occupancy"
+    
+    zone_id = Column(UUID(as_uuid=True), ForeignKey("yard_zones.id"), primary_key=True)
+    location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=False, index=True)
+    occupied_count = Column(Integer, nullable=False, default=0)  # Open positions, with or without a spot
+    spot_bitmap = Column(Text, nullable=False, default="0")  # Hex; bit i set while spot i + 1 is taken
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 # Pydantic Models
 class TrailerCreate(BaseModel):
     carrier_id: str
@@ -121,6 +169,8 @@ class TrailerCreate(BaseModel):
 class TrailerUpdate(BaseModel):
     status: Optional[str] = None
     equipment_type: Optional[str] = None
+    assigned_dock_id: Optional[str] = None
+    expected_departure: Optional[datetime] = None
 
 class TrailerLocationUpdate(BaseModel):
     trailer_id: str
@@ -129,6 +179,12 @@ class TrailerLocationUpdate(BaseModel):
     accuracy_meters: Optional[float] = None
     timestamp: Optional[datetime] = None
 
+class TrailerLocationBatch(BaseModel):
+    updates: List[TrailerLocationUpdate]
+
+class GateRadiusUpdate(BaseModel):
+    radius_meters: Optional[float] = None  # None restores the default
+
 class YardZoneCreate(BaseModel):
     location_id: str
     zone_name: str
@@ -217,62 +273,873 @@ def is_point_in_polygon(point_lat: float, point_lon: float, polygon_coords: List
     
     return inside
 
+# Compiled yard geometry
+YARD_GEOMETRY_TTL_SECONDS = int(os.getenv("YARD_GEOMETRY_TTL_SECONDS", "60"))
+GATE_RADIUS_METERS = 100
+MAX_GATE_RADIUS_METERS = 5000
+GATE_CELL_DEGREES = 0.01  # ~1.1 km of latitude
+METERS_PER_DEGREE = 111000  # Slightly under the true ~111195, so cell ranges err on the wide side
+
+def gate_cell(latitude: float, longitude: float) -> Tuple[int, int]:
+    return (math.floor(latitude / GATE_CELL_DEGREES), math.floor(longitude / GATE_CELL_DEGREES))
+
+def gate_cells_within(latitude: float, longitude: float, radius_meters: float) -> List[Tuple[int, int]]:
+    """Grid cells overlapping the bounding box of a circle around a gate"""
+    d_lat = radius_meters / METERS_PER_DEGREE
+    d_lon = radius_meters / (METERS_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude) + d_lat, 90))), 0.01))
+    south, west = gate_cell(latitude - d_lat, longitude - d_lon)
+    north, east = gate_cell(latitude + d_lat, longitude + d_lon)
+    return [(row, col) for row in range(south, north + 1) for col in range(west, east + 1)]
+
+def parse_gate(geojson_gate: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of a GeoJSON Point gate, or None if missing or malformed"""
+    if not geojson_gate:
+        return None
+    try:
+        gate_data = json.loads(geojson_gate)
+        if gate_data.get("type") == "Point":
+            gate_coords = gate_data.get("coordinates", [])
+            if len(gate_coords) >= 2:
+                return (float(gate_coords[1]), float(gate_coords[0]))
+    except Exception:
+        pass
+    return None
+
+def parse_polygon(geojson_boundary: Optional[str]) -> Optional[Tuple[float, ...]]:
+    """Outer ring of a GeoJSON Polygon as a flat (lon, lat, lon, lat, ...) tuple"""
+    if not geojson_boundary:
+        return None
+    try:
+        boundary_data = json.loads(geojson_boundary)
+        if boundary_data.get("type") == "Polygon":
+            coordinates = boundary_data.get("coordinates", [[]])[0]
+            flat = tuple(float(value) for coord in coordinates for value in (coord[0], coord[1]))
+            if flat:
+                return flat
+    except Exception:
+        pass
+    return None
+
+class CompiledZone:
+    """A yard zone's boundary as a flat coordinate tuple with its bounding box"""
+    __slots__ = ("id", "location_id", "zone_name", "capacity", "coords", "bbox", "spots")
+    
+    def __init__(self, id: str, location_id: str, zone_name: str, capacity: int, coords: Tuple[float, ...],
+                 spots: Optional[List[Tuple[float, float]]] = None):
+        self.id = id
+        self.location_id = location_id
+        self.zone_name = zone_name
+        self.capacity = capacity
+        self.coords = coords
+        xs, ys = coords[0::2], coords[1::2]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.spots = spots if spots and len(spots) >= capacity else self.default_spots()
+    
+    def default_spots(self) -> List[Tuple[float, float]]:
+        """(lat, lon) per spot, evenly spaced along the middle of the zone's longer side"""
+        min_x, min_y, max_x, max_y = self.bbox
+        mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        wide = (max_x - min_x) * math.cos(math.radians(mid_y)) >= max_y - min_y
+        spots = []
+        for i in range(self.capacity):
+            t = (i + 0.5) / self.capacity
+            if wide:
+                spots.append((mid_y, min_x + t * (max_x - min_x)))
+            else:
+                spots.append((min_y + t * (max_y - min_y), mid_x))
+        return spots
+    
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """Same ray casting as is_point_in_polygon, over the flat coordinates"""
+        min_x, min_y, max_x, max_y = self.bbox
+        x, y = longitude, latitude
+        if x > max_x or y <= min_y or y > max_y:
+            return False
+        
+        coords = self.coords
+        n = len(coords)
+        inside = False
+        p1x, p1y = coords[0], coords[1]
+        for i in range(2, n + 2, 2):
+            p2x, p2y = coords[i % n], coords[i % n + 1]
+            if min(p1y, p2y) < y <= max(p1y, p2y) and x <= max(p1x, p2x):
+                if p1x == p2x or x <= (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x:
+                    inside = not inside
+            p1x, p1y = p2x, p2y
+        return inside
+
+class LocationGeometry:
+    __slots__ = ("id", "name", "gate", "gate_radius", "zones", "docks", "_dock_distances")
+    
+    def __init__(self, id: str, name: str, gate: Optional[Tuple[float, float]],
+                 gate_radius: Optional[float] = None):
+        self.id = id
+        self.name = name
+        self.gate = gate
+        self.gate_radius = gate_radius or GATE_RADIUS_METERS
+        self.zones: List[CompiledZone] = []
+        self.docks: Dict[str, Tuple[float, float]] = {}  # Dock id to (lat, lon)
+        self._dock_distances: Optional[Dict[str, Dict[str, List[float]]]] = None
+    
+    def dock_distances(self) -> Dict[str, Dict[str, List[float]]]:
+        """Spot-to-dock distance matrix in meters: dock id -> zone id -> distance per spot index.
+        
+        Under the "nearest" key, each spot's distance to its closest dock.
+        Built on first use and kept until the geometry is reloaded.
+        """
+        if self._dock_distances is None:
+            matrix: Dict[str, Dict[str, List[float]]] = {}
+            for dock_id, (dock_lat, dock_lon) in self.docks.items():
+                matrix[dock_id] = {
+                    zone.id: [calculate_distance(lat, lon, dock_lat, dock_lon) for lat, lon in zone.spots]
+                    for zone in self.zones
+                }
+            if matrix:
+                matrix["nearest"] = {
+                    zone.id: [min(column) for column in zip(*(matrix[dock_id][zone.id] for dock_id in self.docks))]
+                    for zone in self.zones
+                }
+            self._dock_distances = matrix
+        return self._dock_distances
+
+class YardGeometry:
+    """Gates and zone polygons for every location, with a grid index over gates"""
+    
+    def __init__(self, locations: List[LocationGeometry], zones: List[CompiledZone],
+                 docks: Optional[List[Tuple[str, str, float, float]]] = None):
+        self.loaded_at = datetime.utcnow()
+        self.locations = {location.id: location for location in locations}
+        self.zones = {zone.id: zone for zone in zones}
+        for zone in zones:
+            location = self.locations.get(zone.location_id)
+            if location:
+                location.zones.append(zone)
+        for dock_id, location_id, latitude, longitude in docks or []:
+            location = self.locations.get(location_id)
+            if location:
+                location.docks[dock_id] = (latitude, longitude)
+        
+        # Each gate is listed in every cell its radius reaches, so a ping only looks at its own cell
+        self.gate_cells: Dict[Tuple[int, int], List[LocationGeometry]] = {}
+        for location in locations:
+            if location.gate:
+                for cell in gate_cells_within(location.gate[0], location.gate[1], location.gate_radius):
+                    self.gate_cells.setdefault(cell, []).append(location)
+    
+    def location_at(self, latitude: float, longitude: float) -> Optional[LocationGeometry]:
+        """Nearest location whose gate radius contains the point"""
+        best, best_distance = None, None
+        for location in self.gate_cells.get(gate_cell(latitude, longitude), ()):
+            distance = calculate_distance(latitude, longitude, location.gate[0], location.gate[1])
+            if distance <= location.gate_radius and (best_distance is None or distance < best_distance):
+                best, best_distance = location, distance
+        return best
+    
+    def zone_at(self, location_id: str, latitude: float, longitude: float) -> Optional[CompiledZone]:
+        location = self.locations.get(str(location_id))
+        if not location:
+            return None
+        for zone in location.zones:
+            if zone.contains(latitude, longitude):
+                return zone
+        return None
+
+_yard_geometry: Optional[YardGeometry] = None
+
+def parse_point(value: Any) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from {"lat": ..., "lon": ...}, or None"""
+    try:
+        return (float(value["lat"]), float(value["lon"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def load_yard_geometry(db: Session) -> YardGeometry:
+    """Compile gates, zone boundaries and dock positions for all locations in three queries"""
+    locations = [
+        LocationGeometry(str(row.id), row.name, parse_gate(row.geojson_gate), row.gate_radius_meters)
+        for row in db.query(Location.id, Location.name, Location.geojson_gate, Location.gate_radius_meters).all()
+    ]
+    zones = []
+    for row in db.query(
+        YardZone.id, YardZone.location_id, YardZone.zone_name, YardZone.capacity, YardZone.geojson_boundary,
+        YardZone.zone_metadata
+    ).order_by(YardZone.created_at, YardZone.id).all():
+        coords = parse_polygon(row.geojson_boundary)
+        if coords:
+            # Surveyed spot positions may be given as metadata {"spots": [{"lat": ..., "lon": ...}, ...]}
+            spots = [parse_point(spot) for spot in ((row.zone_metadata or {}).get("spots") or [])]
+            zones.append(CompiledZone(
+                str(row.id), str(row.location_id), row.zone_name, row.capacity or 0, coords,
+                spots if spots and all(spots) else None
+            ))
+    docks = []
+    try:
+        unplaced = 0
+        for row in db.query(Dock.id, Dock.location_id, Dock.capabilities).order_by(Dock.id).all():
+            point = parse_point(row.capabilities)
+            if point:
+                docks.append((str(row.id), str(row.location_id), point[0], point[1]))
+            else:
+                unplaced += 1
+        if unplaced:
+            logger.info(f"{unplaced} docks have no lat/lon capabilities and are left out of spot and move planning")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Dock positions unavailable: {str(e)}")
+    return YardGeometry(locations, zones, docks)
+
+def get_yard_geometry(db: Session) -> YardGeometry:
+    """Cached yard geometry, reloaded every YARD_GEOMETRY_TTL_SECONDS to pick up edits from elsewhere"""
+    global _yard_geometry
+    geometry = _yard_geometry
+    if geometry is None or (datetime.utcnow() - geometry.loaded_at).total_seconds() > YARD_GEOMETRY_TTL_SECONDS:
+        geometry = _yard_geometry = load_yard_geometry(db)
+    return geometry
+
+def invalidate_yard_geometry():
+    """Force a reload after locations or zones change"""
+    global _yard_geometry
+    _yard_geometry = None
+
 def determine_yard_zone(latitude: float, longitude: float, location_id: str, db: Session) -> Optional[str]:
     """Determine which yard zone a trailer is in based on coordinates"""
-    zones = db.query(YardZone).filter(YardZone.location_id == location_id).all()
+    zone = get_yard_geometry(db).zone_at(location_id, latitude, longitude)
+    return zone.id if zone else None
+
+# Zone occupancy, kept in step with open TrailerPositions
+def spot_name(zone_name: str, index: int) -> str:
+    return f"{zone_name}-{index + 1:03d}"
+
+def spot_index(zone_name: str, spot_number: Optional[str]) -> Optional[int]:
+    """Bit index of a spot named by spot_name, or None for spots outside the numbering"""
+    prefix = f"{zone_name}-"
+    if not spot_number or not spot_number.startswith(prefix):
+        return None
+    try:
+        index = int(spot_number[len(prefix):]) - 1
+    except ValueError:
+        return None
+    return index if index >= 0 else None
+
+def lock_zone_occupancies(zone_keys: List[Tuple[str, str]], db: Session) -> Dict[str, YardZoneOccupancy]:
+    """Occupancy rows for (zone_id, location_id) pairs, locked in zone id order until the transaction ends"""
+    if not zone_keys:
+        return {}
+    zone_keys = sorted(set(zone_keys))
+    db.execute(
+        pg_insert(YardZoneOccupancy).values([
+            {"zone_id": zone_id, "location_id": location_id, "occupied_count": 0, "spot_bitmap": "0",
+             "updated_at": datetime.utcnow()}
+            for zone_id, location_id in zone_keys
+        ]).on_conflict_do_nothing()
+    )
+    # Locking in a fixed order keeps trailers crossing between zones from deadlocking
+    occupancies = db.query(YardZoneOccupancy).filter(
+        YardZoneOccupancy.zone_id.in_([zone_id for zone_id, _ in zone_keys])
+    ).order_by(YardZoneOccupancy.zone_id).with_for_update().populate_existing().all()
+    return {str(occupancy.zone_id): occupancy for occupancy in occupancies}
+
+def claim_spot(occupancy: YardZoneOccupancy, zone: CompiledZone,
+               costs: Optional[List[float]] = None) -> Optional[str]:
+    """Count a new position in a locked zone and take a free spot, if any.
     
-    for zone in zones:
-        if zone.geojson_boundary:
-            try:
-                boundary_data = json.loads(zone.geojson_boundary)
-                if boundary_data.get("type") == "Polygon":
-                    coordinates = boundary_data.get("coordinates", [[]])[0]
-                    polygon_coords = [{"lat": coord[1], "lon": coord[0]} for coord in coordinates]
-                    
-                    if is_point_in_polygon(latitude, longitude, polygon_coords):
-                        return str(zone.id)
-            except:
-                continue
+    With costs (one per spot index) the cheapest free spot wins, otherwise
+    the lowest numbered one.
+    """
+    taken = int(occupancy.spot_bitmap, 16)
+    free = ~taken & ((1 << zone.capacity) - 1)
     
-    return None
+    spot_number = None
+    if free:
+        if costs:
+            index = min(iter_bits(free), key=lambda i: (costs[i], i))
+        else:
+            index = (free & -free).bit_length() - 1
+        taken |= 1 << index
+        spot_number = spot_name(zone.zone_name, index)
+    
+    occupancy.occupied_count += 1
+    occupancy.spot_bitmap = format(taken, "x")
+    occupancy.updated_at = datetime.utcnow()
+    return spot_number
 
-def find_available_spot(zone_id: str, db: Session) -> Optional[str]:
-    """Find an available spot in a yard zone"""
-    zone = db.query(YardZone).filter(YardZone.id == zone_id).first()
-    if not zone:
+def release_spot(occupancy: YardZoneOccupancy, zone_name: Optional[str], spot_number: Optional[str]):
+    """Undo claim_spot for a position that is being closed"""
+    taken = int(occupancy.spot_bitmap, 16)
+    index = spot_index(zone_name, spot_number) if zone_name else None
+    if index is not None:
+        taken &= ~(1 << index)
+    
+    occupancy.occupied_count = max(0, occupancy.occupied_count - 1)
+    occupancy.spot_bitmap = format(taken, "x")
+    occupancy.updated_at = datetime.utcnow()
+
+def iter_bits(bits: int):
+    """Indices of set bits, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+# Spot allocation and jockey moves
+LONG_DWELL_HOURS = float(os.getenv("LONG_DWELL_HOURS", "8"))
+MIN_MOVE_GAIN_METERS = float(os.getenv("MIN_MOVE_GAIN_METERS", "50"))
+
+def spot_costs(location: Optional[LocationGeometry], zone: CompiledZone, trailer: Trailer,
+               now: datetime) -> Optional[List[float]]:
+    """Cost per spot in a zone for parking this trailer, or None for plain lowest-numbered allocation.
+    
+    Trailers leaving within LONG_DWELL_HOURS go as close as possible to their
+    assigned dock (or any dock if none is assigned); longer stays are pushed
+    away from the docks to keep the near spots free.
+    """
+    if not location or (not trailer.assigned_dock_id and not trailer.expected_departure):
+        return None
+    matrix = location.dock_distances()
+    distances = matrix.get(str(trailer.assigned_dock_id) if trailer.assigned_dock_id else "nearest")
+    if distances is None:
+        distances = matrix.get("nearest")
+    if distances is None or zone.id not in distances:
         return None
     
-    # Get occupied spots
-    occupied_positions = db.query(TrailerPosition).filter(
-        TrailerPosition.yard_zone_id == zone_id,
-        TrailerPosition.exited_at.is_(None)
-    ).all()
+    distances = distances[zone.id]
+    if trailer.expected_departure and (trailer.expected_departure - now).total_seconds() > LONG_DWELL_HOURS * 3600:
+        return [-distance for distance in distances]
+    return distances
+
+def plan_jockey_moves(location: LocationGeometry, trailers: List[Tuple[Trailer, TrailerPosition]],
+                      occupancies: Dict[str, YardZoneOccupancy], now: datetime, hours: float,
+                      max_moves: int) -> List[Dict[str, Any]]:
+    """Propose moves that bring trailers departing in the next `hours` closer to their dock.
     
-    occupied_spots = {pos.spot_number for pos in occupied_positions if pos.spot_number}
+    Trailers are taken in departure order and each moves at most once, to the
+    free spot nearest its assigned dock anywhere in the location, and only if
+    that saves at least MIN_MOVE_GAIN_METERS. A vacated spot is free for the
+    trailers after it. Nothing is changed in the database.
+    """
+    matrix = location.dock_distances()
+    zones = {zone.id: zone for zone in location.zones}
+    taken = {
+        zone.id: int(occupancies[zone.id].spot_bitmap, 16) if zone.id in occupancies else 0
+        for zone in location.zones
+    }
+    horizon = now + timedelta(hours=hours)
     
-    # Generate spot numbers (simple numbering system)
-    for i in range(1, zone.capacity + 1):
-        spot_number = f"{zone.zone_name}-{i:03d}"
-        if spot_number not in occupied_spots:
-            return spot_number
+    candidates = sorted(
+        (
+            (trailer, position) for trailer, position in trailers
+            if trailer.assigned_dock_id and str(trailer.assigned_dock_id) in matrix
+            and trailer.expected_departure and trailer.expected_departure <= horizon
+        ),
+        key=lambda item: item[0].expected_departure
+    )
     
-    return None
+    moves = []
+    for trailer, position in candidates:
+        if len(moves) >= max_moves:
+            break
+        distances = matrix[str(trailer.assigned_dock_id)]
+        zone_id = str(position.yard_zone_id)
+        zone = zones.get(zone_id)
+        index = spot_index(zone.zone_name, position.spot_number) if zone else None
+        current = distances[zone_id][index] if index is not None and index < zone.capacity else float("inf")
+        
+        best = None
+        for candidate in location.zones:
+            free = ~taken[candidate.id] & ((1 << candidate.capacity) - 1)
+            for i in iter_bits(free):
+                distance = distances[candidate.id][i]
+                if best is None or distance < best[0]:
+                    best = (distance, candidate, i)
+        
+        if best is None or current - best[0] < MIN_MOVE_GAIN_METERS:
+            continue
+        distance, target, target_index = best
+        taken[target.id] |= 1 << target_index
+        if index is not None:
+            taken[zone_id] &= ~(1 << index)
+        moves.append({
+            "trailer_id": str(trailer.id),
+            "plate": trailer.plate,
+            "dock_id": str(trailer.assigned_dock_id),
+            "expected_departure": trailer.expected_departure,
+            "from_zone_id": zone_id,
+            "from_spot": position.spot_number,
+            "to_zone_id": target.id,
+            "to_spot": spot_name(target.zone_name, target_index),
+            "distance_before_m": round(current, 1) if current != float("inf") else None,
+            "distance_after_m": round(distance, 1)
+        })
+    return moves
 
-async def create_yard_event(event_type: str, trailer_id: str, location_id: str, 
-                           payload: Dict[str, Any], db: Session):
-    """Create a logistics event for yard operations"""
+# Trailer location fixes
+MAX_LOCATION_BATCH = int(os.getenv("MAX_LOCATION_BATCH", "5000"))
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Offset-aware timestamps as naive UTC, so they compare with utcnow()"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def apply_location_fixes(fixes: List[TrailerLocationUpdate], geometry: YardGeometry,
+                         db: Session) -> Tuple[List[Optional[Dict[str, Any]]], List[Tuple]]:
+    """Apply location fixes for any number of trailers in one transaction.
+    
+    Trailers and their open positions are loaded in two queries and each
+    trailer's fixes are applied in timestamp order; fixes older than the
+    trailer's last_seen (delayed or replayed uploads) are skipped, and
+    positions open and close at their fix's time. Returns a result per fix
+    (None for unknown trailers) and the yard events to record, as
+    (event_type, trailer_id, location_id, payload) tuples. Changes are left
+    in the session for the caller to commit.
+    """
+    now = datetime.utcnow()
+    trailer_keys: List[Optional[str]] = []
+    for fix in fixes:
+        try:
+            trailer_keys.append(str(uuid.UUID(fix.trailer_id)))
+        except ValueError:
+            trailer_keys.append(None)
+    trailer_ids = {uuid.UUID(key) for key in trailer_keys if key}
+    
+    trailers = {
+        str(trailer.id): trailer
+        for trailer in db.query(Trailer).filter(Trailer.id.in_(trailer_ids)).all()
+    } if trailer_ids else {}
+    open_positions = {
+        str(position.trailer_id): position
+        for position in db.query(TrailerPosition).filter(
+            TrailerPosition.trailer_id.in_(trailer_ids),
+            TrailerPosition.exited_at.is_(None)
+        ).all()
+    } if trailer_ids else {}
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(fixes)
+    events = []
+    # Spot changes are replayed in order once the touched zones are locked
+    spot_changes: List[Tuple[str, TrailerPosition, Optional[CompiledZone], Optional[Dict[str, Any]]]] = []
+    new_positions = []
+    
+    # Device clocks running ahead must not hold back later fixes
+    fix_times = [min(naive_utc(fix.timestamp) or now, now) for fix in fixes]
+    order = sorted(range(len(fixes)), key=lambda i: (fix_times[i], i))
+    for i in order:
+        fix = fixes[i]
+        at = fix_times[i]
+        trailer_key = trailer_keys[i]
+        trailer = trailers.get(trailer_key)
+        if not trailer:
+            continue
+        if trailer.last_seen and at < trailer.last_seen:
+            results[i] = {"trailer_id": fix.trailer_id, "current_status": trailer.status.value, "stale": True}
+            continue
+        current_position = open_positions.get(trailer_key)
+        
+        # Update trailer's last known position
+        trailer.last_latitude = fix.latitude
+        trailer.last_longitude = fix.longitude
+        trailer.last_seen = at
+        
+        # Check if trailer is at any location
+        current_location = geometry.location_at(fix.latitude, fix.longitude)
+        yard_zone = None
+        
+        if current_location:
+            # Trailer is at a location
+            if trailer.status == TrailerStatusEnum.enroute:
+                trailer.status = TrailerStatusEnum.at_gate
+                events.append(("arrive", trailer_key, current_location.id, {
+                    "trailer_plate": trailer.plate,
+                    "location_name": current_location.name,
+                    "arrival_time": trailer.last_seen.isoformat()
+                }))
+            
+            # Check if trailer entered a yard zone
+            yard_zone = geometry.zone_at(current_location.id, fix.latitude, fix.longitude)
+            
+            if yard_zone:
+                # Trailer is in a yard zone
+                if not current_position or str(current_position.yard_zone_id) != yard_zone.id:
+                    # Exit previous position if exists
+                    if current_position:
+                        current_position.exited_at = at
+                        spot_changes.append(("release", current_position, None, None))
+                    
+                    current_position = TrailerPosition(
+                        id=uuid.uuid4(),
+                        trailer_id=trailer.id,
+                        location_id=uuid.UUID(current_location.id),
+                        yard_zone_id=uuid.UUID(yard_zone.id),
+                        latitude=fix.latitude,
+                        longitude=fix.longitude,
+                        accuracy_meters=fix.accuracy_meters,
+                        entered_at=at
+                    )
+                    new_positions.append(current_position)
+                    open_positions[trailer_key] = current_position
+                    trailer.status = TrailerStatusEnum.in_yard
+                    
+                    payload = {
+                        "trailer_plate": trailer.plate,
+                        "zone_name": yard_zone.zone_name,
+                        "spot_number": None,
+                        "entry_time": at.isoformat()
+                    }
+                    spot_changes.append(("claim", current_position, yard_zone, payload))
+                    events.append(("yard_entry", trailer_key, current_location.id, payload))
+            
+            elif current_position and current_position.yard_zone_id:
+                # Trailer left yard zone
+                current_position.exited_at = at
+                del open_positions[trailer_key]
+                trailer.status = TrailerStatusEnum.at_gate
+                
+                zone = geometry.zones.get(str(current_position.yard_zone_id))
+                payload = {
+                    "trailer_plate": trailer.plate,
+                    "zone_name": zone.zone_name if zone else "Unknown",
+                    "spot_number": current_position.spot_number,
+                    "exit_time": at.isoformat()
+                }
+                spot_changes.append(("release", current_position, None, payload))
+                events.append(("yard_exit", trailer_key, current_location.id, payload))
+        
+        else:
+            # Trailer is not at any location
+            if current_position:
+                current_position.exited_at = at
+                del open_positions[trailer_key]
+                spot_changes.append(("release", current_position, None, None))
+            
+            if trailer.status in [TrailerStatusEnum.at_gate, TrailerStatusEnum.in_yard]:
+                trailer.status = TrailerStatusEnum.enroute
+        
+        trailer.current_location_id = uuid.UUID(current_location.id) if current_location else None
+        
+        results[i] = {
+            "trailer_id": fix.trailer_id,
+            "current_status": trailer.status.value,
+            "at_location": current_location.name if current_location else None,
+            "in_yard_zone": yard_zone is not None
+        }
+    
+    occupancies = lock_zone_occupancies([
+        (str(position.yard_zone_id), str(position.location_id))
+        for _, position, _, _ in spot_changes if position.yard_zone_id
+    ], db)
+    # Zones missing from cached geometry (edited since, or without a boundary now) still free their spots
+    unloaded = {
+        position.yard_zone_id for change, position, _, _ in spot_changes
+        if change == "release" and position.yard_zone_id and str(position.yard_zone_id) not in geometry.zones
+    }
+    zone_names = {
+        str(zone_id): zone_name for zone_id, zone_name in
+        db.query(YardZone.id, YardZone.zone_name).filter(YardZone.id.in_(unloaded)).all()
+    } if unloaded else {}
+    for change, position, zone, payload in spot_changes:
+        if not position.yard_zone_id:
+            continue
+        occupancy = occupancies[str(position.yard_zone_id)]
+        if change == "claim":
+            costs = spot_costs(geometry.locations.get(zone.location_id), zone, trailers[str(position.trailer_id)], now)
+            position.spot_number = claim_spot(occupancy, zone, costs)
+        else:
+            zone_id = str(position.yard_zone_id)
+            zone_name = geometry.zones[zone_id].zone_name if zone_id in geometry.zones else zone_names.get(zone_id)
+            release_spot(occupancy, zone_name, position.spot_number)
+        if payload is not None:
+            payload["spot_number"] = position.spot_number
+    
+    for trailer_key, trailer in trailers.items():
+        position = open_positions.get(trailer_key)
+        trailer.current_zone_id = position.yard_zone_id if position else None
+        trailer.current_spot_number = position.spot_number if position else None
+    
+    db.add_all(new_positions)
+    return results, events
+
+# Yard event writer
+EVENT_SPOOL_DIR = os.getenv("EVENT_SPOOL_DIR", "/tmp/yard-events")
+EVENT_FLUSH_SIZE = int(os.getenv("EVENT_FLUSH_SIZE", "200"))
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "1.0"))
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "1.0"))
+EVENT_TAIL_MAX_WAIT = 60
+EVENT_LOG_LOCK = 7_956_003  # Advisory lock serializing event inserts
+
+def insert_events(rows: List[Dict[str, Any]]):
+    """Insert spooled event rows with a session of their own.
+    
+    Rows already in the table (by id) are skipped, so replays are harmless.
+    If the database rejects the batch, rows are retried one at a time and the
+    ones it still rejects are dropped; OperationalError (database unreachable)
+    propagates so the caller can retry later.
+    
+    Inserts hold an advisory lock until commit, so seq values become visible
+    in order and a reader tailing past seq N never misses a smaller one.
+    """
+    def values(row):
+        return {
+            "id": uuid.UUID(row["id"]),
+            "location_id": uuid.UUID(row["location_id"]),
+            "type": EventTypeEnum(row["type"]),
+            "ref_table": row["ref_table"],
+            "ref_id": uuid.UUID(row["ref_id"]) if row["ref_id"] else None,
+            "payload": row["payload"],
+            "at": datetime.fromisoformat(row["at"])
+        }
+    
+    db = SessionLocal()
     try:
-        event = LogisticsEvent(
-            location_id=location_id,
-            type=EventTypeEnum(event_type),
-            ref_table="trailers",
-            ref_id=trailer_id,
-            payload=payload
-        )
+        try:
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EVENT_LOG_LOCK})
+            db.execute(pg_insert(LogisticsEvent).values([values(row) for row in rows]).on_conflict_do_nothing())
+            db.commit()
+            return
+        except OperationalError:
+            raise
+        except Exception:
+            db.rollback()
         
-        db.add(event)
-        db.commit()
+        for row in rows:
+            try:
+                db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EVENT_LOG_LOCK})
+                db.execute(pg_insert(LogisticsEvent).values(values(row)).on_conflict_do_nothing())
+                db.commit()
+            except OperationalError:
+                raise
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Dropping yard event {row.get('id')}: {str(e)}")
+    finally:
+        db.close()
+
+class YardEventWriter:
+    """Buffers LogisticsEvents and inserts them in batches, off the request path.
+    
+    Each event is appended to this process's current spool file before it is
+    queued. After every flushed batch the spool is truncated if it is fully
+    inserted, or else rotated to a fresh file; rotated files are deleted once
+    their last event is inserted. Spool files left behind by a process that
+    died are replayed on startup; a file is only replayed when its flock is
+    free, i.e. its owner is gone.
+    """
+    
+    def __init__(self, spool_dir: str):
+        self.spool_dir = spool_dir
+        self.spool = None
+        # [spool file, path, events in it not yet inserted], oldest first; the last one is self.spool
+        self.segments: deque = deque()
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flushed: Optional[asyncio.Event] = None
+    
+    def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.replay_orphans()
+        self.open_spool()
+        self.queue = asyncio.Queue()
+        self.flushed = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+    
+    def open_spool(self):
+        """Start a new spool file, locked before replay_orphans can see its name"""
+        path = os.path.join(self.spool_dir, f"events-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        spool = open(f"{path}.tmp", "x", encoding="utf-8")
+        fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(f"{path}.tmp", path)
+        self.spool = spool
+        self.segments.append([spool, path, 0])
+    
+    @staticmethod
+    def remove_spool(spool, path: str):
+        """Delete a fully inserted spool; unlinked while still locked so no one replays it"""
+        os.remove(path)
+        spool.close()
+    
+    def replay_orphans(self):
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "events-*.jsonl"))):
+            try:
+                spool = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # Replayed by another worker meanwhile
+            with spool:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Owned by a live process
+                
+                rows = []
+                for line in spool:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        continue  # Torn final line from a crash mid-write
+                try:
+                    for i in range(0, len(rows), EVENT_FLUSH_SIZE):
+                        insert_events(rows[i:i + EVENT_FLUSH_SIZE])
+                except OperationalError as e:
+                    logger.error(f"Failed to replay yard event spool {path}: {str(e)}")
+                    continue
+                if os.path.exists(path):
+                    os.remove(path)
+                if rows:
+                    logger.info(f"Replayed {len(rows)} yard events from {path}")
+    
+    def write(self, event_type: str, location_id: str, ref_table: str, ref_id: Optional[str],
+              payload: Dict[str, Any]):
+        if self.task is None:
+            self.start()
+        
+        row = {
+            "id": str(uuid.uuid4()),
+            "location_id": str(location_id),
+            "type": event_type,
+            "ref_table": ref_table,
+            "ref_id": str(ref_id) if ref_id else None,
+            "payload": payload,
+            "at": datetime.utcnow().isoformat()
+        }
+        # In the OS page cache once flushed, so it survives the process dying
+        self.spool.write(json.dumps(row, default=str) + "\n")
+        self.spool.flush()
+        self.segments[-1][2] += 1
+        self.queue.put_nowait(row)
+    
+    def mark_inserted(self, count: int):
+        """Credit `count` inserted events to the oldest spools and delete the drained ones.
+        Events are queued in spool order, so batches drain the spools front to back."""
+        while count:
+            segment = self.segments[0]
+            taken = min(count, segment[2])
+            segment[2] -= taken
+            count -= taken
+            if segment[2] or len(self.segments) == 1:
+                break
+            spool, path, _ = self.segments.popleft()
+            self.remove_spool(spool, path)
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + EVENT_FLUSH_SECONDS
+            while len(batch) < EVENT_FLUSH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.flush(batch)
+    
+    async def flush(self, batch: List[Dict[str, Any]]):
+        delay = 1.0
+        while True:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, insert_events, batch)
+                break
+            except OperationalError as e:
+                logger.warning(f"Yard event flush failed, retrying in {delay:.0f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        
+        self.mark_inserted(len(batch))
+        if self.segments[-1][2] == 0:
+            self.spool.seek(0)
+            self.spool.truncate()
+        else:
+            # Still holds queued events: new writes go to a fresh spool so this one can drain
+            self.open_spool()
+        
+        # Wake tailing readers; set() releases current waiters even though we clear right away
+        self.flushed.set()
+        self.flushed.clear()
+    
+    async def wait_for_flush(self, timeout: float):
+        """Sleep until this process flushes events or timeout passes"""
+        if self.flushed is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(self.flushed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def stop(self):
+        """Flush what is queued; anything that cannot be written stays in the spool for the next start"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
         
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        try:
+            if batch:
+                await asyncio.get_running_loop().run_in_executor(None, insert_events, batch)
+                self.mark_inserted(len(batch))
+        except OperationalError as e:
+            logger.error(f"Failed to flush yard events on shutdown: {str(e)}")
+        
+        while self.segments:
+            spool, path, count = self.segments.popleft()
+            if count == 0:
+                self.remove_spool(spool, path)
+            else:
+                spool.close()
+        self.spool = None
+
+event_writer = YardEventWriter(EVENT_SPOOL_DIR)
+
+def event_json(event) -> Dict[str, Any]:
+    return {
+        "id": str(event.id),
+        "seq": event.seq,
+        "location_id": str(event.location_id),
+        "type": event.type.value,
+        "ref_table": event.ref_table,
+        "ref_id": str(event.ref_id) if event.ref_id else None,
+        "payload": event.payload,
+        "at": event.at
+    }
+
+def read_events_since(since: int, location_id: Optional[str], event_type: Optional[str],
+                      limit: int) -> List[LogisticsEvent]:
+    """Events after seq `since` in seq order, with a short-lived session of their own"""
+    db = SessionLocal()
+    try:
+        query = db.query(LogisticsEvent).filter(LogisticsEvent.seq > since)
+        if location_id:
+            query = query.filter(LogisticsEvent.location_id == location_id)
+        if event_type:
+            query = query.filter(LogisticsEvent.type == EventTypeEnum(event_type))
+        return query.order_by(LogisticsEvent.seq).limit(limit).all()
+    finally:
+        db.close()
+
+async def tail_events(since: int, location_id: Optional[str], event_type: Optional[str],
+                      limit: int, wait: float) -> List[LogisticsEvent]:
+    """Events after `since`, waiting up to `wait` seconds for the first one to arrive.
+    
+    Local flushes wake the wait immediately; events written by other processes
+    are picked up by polling every EVENT_POLL_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        events = await loop.run_in_executor(None, read_events_since, since, location_id, event_type, limit)
+        remaining = deadline - loop.time()
+        if events or remaining <= 0:
+            return events
+        await event_writer.wait_for_flush(min(EVENT_POLL_SECONDS, remaining))
+
+async def create_yard_event(event_type: str, trailer_id: str, location_id: str, 
+                           payload: Dict[str, Any]):
+    """Create a logistics event for yard operations"""
+    try:
+        event_writer.write(event_type, location_id, "trailers", trailer_id, payload)
         logger.info(f"Yard event created: {event_type} for trailer {trailer_id}")
     
     except Exception as e:
@@ -303,6 +1170,135 @@ async def send_yard_notification(event_type: str, trailer_id: str, details: Dict
     except Exception as e:
         logger.error(f"Failed to send yard notification: {str(e)}")
 
+@app.on_event("startup")
+def ensure_zone_occupancy():
+    """Create the occupancy table and seed rows for zones that have none from their open positions"""
+    db = SessionLocal()
+    try:
+        YardZoneOccupancy.__table__.create(bind=engine, checkfirst=True)
+        
+        zones = db.query(YardZone.id, YardZone.location_id, YardZone.zone_name).outerjoin(
+            YardZoneOccupancy, YardZoneOccupancy.zone_id == YardZone.id
+        ).filter(YardZoneOccupancy.zone_id.is_(None)).all()
+        if not zones:
+            return
+        
+        rows = {
+            zone.id: {"zone_id": zone.id, "location_id": zone.location_id, "occupied_count": 0,
+                      "taken": 0, "zone_name": zone.zone_name}
+            for zone in zones
+        }
+        for zone_id, spot_number in db.query(TrailerPosition.yard_zone_id, TrailerPosition.spot_number).filter(
+            TrailerPosition.yard_zone_id.in_(list(rows)),
+            TrailerPosition.exited_at.is_(None)
+        ).all():
+            row = rows[zone_id]
+            row["occupied_count"] += 1
+            index = spot_index(row["zone_name"], spot_number)
+            if index is not None:
+                row["taken"] |= 1 << index
+        
+        # Another worker may seed the same zones concurrently
+        db.execute(pg_insert(YardZoneOccupancy).values([
+            {"zone_id": row["zone_id"], "location_id": row["location_id"], "occupied_count": row["occupied_count"],
+             "spot_bitmap": format(row["taken"], "x"), "updated_at": datetime.utcnow()}
+            for row in rows.values()
+        ]).on_conflict_do_nothing())
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to prepare yard zone occupancy: {str(e)}")
+    finally:
+        db.close()
+
+def create_indexes_concurrently(table):
+    """Build the table's missing indexes without blocking writes, rebuilding any an interrupted build left invalid"""
+    # CONCURRENTLY cannot run inside a transaction and keeps pings flowing on large tables
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in table.indexes:
+            valid = conn.execute(
+                text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": index.name}
+            ).scalar()
+            if valid is False:
+                logger.warning(f"Rebuilding invalid index {index.name}")
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            if not valid:
+                index.create(bind=conn)
+
+@app.on_event("startup")
+def ensure_trailer_current_position():
+    """Add the current-position and dispatch columns and their indexes, backfilling from open positions"""
+    # Separate transactions so a failed backfill cannot roll back columns the ORM selects
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE trailers ADD COLUMN IF NOT EXISTS current_location_id UUID REFERENCES locations(id)"))
+            conn.execute(text("ALTER TABLE trailers ADD COLUMN IF NOT EXISTS current_zone_id UUID REFERENCES yard_zones(id)"))
+            conn.execute(text("ALTER TABLE trailers ADD COLUMN IF NOT EXISTS current_spot_number VARCHAR(50)"))
+            conn.execute(text("ALTER TABLE trailers ADD COLUMN IF NOT EXISTS assigned_dock_id UUID"))
+            conn.execute(text("ALTER TABLE trailers ADD COLUMN IF NOT EXISTS expected_departure TIMESTAMP"))
+    except Exception as e:
+        logger.error(f"Failed to add trailer current position columns: {str(e)}")
+    
+    # Columns added before the constraint existed have none; NOT VALID skips the scan, then validate separately
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "DO $$ BEGIN "
+                "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'trailers_assigned_dock_id_fkey') THEN "
+                "ALTER TABLE trailers ADD CONSTRAINT trailers_assigned_dock_id_fkey "
+                "FOREIGN KEY (assigned_dock_id) REFERENCES docks(id) NOT VALID; "
+                "END IF; END $$"
+            ))
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE trailers VALIDATE CONSTRAINT trailers_assigned_dock_id_fkey"))
+    except Exception as e:
+        logger.error(f"Failed to add trailer assigned dock constraint: {str(e)}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE locations ADD COLUMN IF NOT EXISTS gate_radius_meters DOUBLE PRECISION"))
+    except Exception as e:
+        logger.error(f"Failed to add location gate radius: {str(e)}")
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE trailers SET current_location_id = p.location_id, current_zone_id = p.yard_zone_id, "
+                "current_spot_number = p.spot_number FROM trailer_positions p "
+                "WHERE p.trailer_id = trailers.id AND p.exited_at IS NULL AND trailers.current_location_id IS NULL"
+            ))
+    except Exception as e:
+        logger.error(f"Failed to backfill trailer current position: {str(e)}")
+    
+    try:
+        create_indexes_concurrently(Trailer.__table__)
+    except Exception as e:
+        logger.error(f"Failed to create trailer indexes: {str(e)}")
+
+@app.on_event("startup")
+async def start_event_writer():
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for event_type in ("yard_entry", "yard_exit"):
+                conn.execute(text(f"ALTER TYPE eventtypeenum ADD VALUE IF NOT EXISTS '{event_type}'"))
+    except Exception as e:
+        logger.error(f"Failed to add yard event types: {str(e)}")
+    
+    try:
+        with engine.begin() as conn:
+            # Existing rows are numbered in storage order
+            conn.execute(text(
+                "ALTER TABLE logistics_events ADD COLUMN IF NOT EXISTS seq BIGINT GENERATED BY DEFAULT AS IDENTITY"
+            ))
+        create_indexes_concurrently(LogisticsEvent.__table__)
+    except Exception as e:
+        logger.error(f"Failed to prepare yard event log: {str(e)}")
+    
+    event_writer.start()
+
+@app.on_event("shutdown")
+async def stop_event_writer():
+    await event_writer.stop()
+
 # API Endpoints
 @app.get("/health")
 async def health_check():
@@ -373,25 +1369,15 @@ async def search_trailers(
         if equipment_type:
             query = query.filter(Trailer.equipment_type == EquipmentTypeEnum(equipment_type))
         
-        trailers = query.order_by(Trailer.last_seen.desc()).limit(limit).all()
+        if location_id:
+            query = query.filter(Trailer.current_location_id == location_id)
         
-        # Filter by location/yard if specified
-        if location_id or in_yard is not None:
-            filtered_trailers = []
-            for trailer in trailers:
-                # Get latest position
-                latest_position = db.query(TrailerPosition).filter(
-                    TrailerPosition.trailer_id == trailer.id
-                ).order_by(TrailerPosition.entered_at.desc()).first()
-                
-                if location_id and latest_position and str(latest_position.location_id) == location_id:
-                    filtered_trailers.append(trailer)
-                elif in_yard is True and latest_position and latest_position.yard_zone_id:
-                    filtered_trailers.append(trailer)
-                elif in_yard is False and (not latest_position or not latest_position.yard_zone_id):
-                    filtered_trailers.append(trailer)
-            
-            trailers = filtered_trailers
+        if in_yard is True:
+            query = query.filter(Trailer.current_zone_id.isnot(None))
+        elif in_yard is False:
+            query = query.filter(Trailer.current_zone_id.is_(None))
+        
+        trailers = query.order_by(Trailer.last_seen.desc()).limit(limit).all()
         
         return [
             {
@@ -403,6 +1389,9 @@ async def search_trailers(
                 "last_latitude": trailer.last_latitude,
                 "last_longitude": trailer.last_longitude,
                 "last_seen": trailer.last_seen,
+                "current_location_id": str(trailer.current_location_id) if trailer.current_location_id else None,
+                "current_zone_id": str(trailer.current_zone_id) if trailer.current_zone_id else None,
+                "current_spot_number": trailer.current_spot_number,
                 "created_at": trailer.created_at
             } for trailer in trailers
         ]
@@ -433,6 +1422,12 @@ async def update_trailer(
         if request.equipment_type:
             trailer.equipment_type = EquipmentTypeEnum(request.equipment_type)
         
+        if request.assigned_dock_id is not None:
+            trailer.assigned_dock_id = request.assigned_dock_id or None
+        
+        if request.expected_departure is not None:
+            trailer.expected_departure = naive_utc(request.expected_departure)
+        
         trailer.last_seen = datetime.utcnow()
         db.commit()
         
@@ -452,157 +1447,85 @@ async def update_trailer_location(
 ):
     """Update trailer location and manage yard positioning"""
     try:
-        trailer = db.query(Trailer).filter(Trailer.id == request.trailer_id).first()
+        results, events = apply_location_fixes([request], get_yard_geometry(db), db)
         
-        if not trailer:
+        if not results[0]:
             raise HTTPException(status_code=404, detail="Trailer not found")
         
-        # Update trailer's last known position
-        trailer.last_latitude = request.latitude
-        trailer.last_longitude = request.longitude
-        trailer.last_seen = request.timestamp or datetime.utcnow()
+        db.commit()
         
-        # Check if trailer is at any location
-        locations = db.query(Location).all()
-        current_location = None
+        for event_type, trailer_id, location_id, payload in events:
+            background_tasks.add_task(create_yard_event, event_type, trailer_id, location_id, payload)
         
-        for location in locations:
-            if location.geojson_gate:
-                try:
-                    gate_data = json.loads(location.geojson_gate)
-                    if gate_data.get("type") == "Point":
-                        gate_coords = gate_data.get("coordinates", [])
-                        if len(gate_coords) >= 2:
-                            distance = calculate_distance(
-                                request.latitude, request.longitude,
-                                gate_coords[1], gate_coords[0]
-                            )
-                            
-                            if distance <= 100:  # Within 100 meters of gate
-                                current_location = location
-                                break
-                except:
-                    continue
+        return {
+            "message": "Trailer location updated",
+            **results[0]
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update location: {str(e)}")
+
+@app.post("/api/trailers/location/batch")
+async def update_trailer_locations(
+    request: TrailerLocationBatch,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Apply location fixes for many trailers in one transaction"""
+    if len(request.updates) > MAX_LOCATION_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOCATION_BATCH} updates per batch")
+    
+    try:
+        results, events = apply_location_fixes(request.updates, get_yard_geometry(db), db)
+        db.commit()
         
-        # Get current position record
-        current_position = db.query(TrailerPosition).filter(
-            TrailerPosition.trailer_id == request.trailer_id,
-            TrailerPosition.exited_at.is_(None)
-        ).first()
+        for event_type, trailer_id, location_id, payload in events:
+            background_tasks.add_task(create_yard_event, event_type, trailer_id, location_id, payload)
         
-        if current_location:
-            # Trailer is at a location
-            if trailer.status == TrailerStatusEnum.enroute:
-                trailer.status = TrailerStatusEnum.at_gate
-                
-                # Create arrival event
-                background_tasks.add_task(
-                    create_yard_event,
-                    "arrive",
-                    request.trailer_id,
-                    str(current_location.id),
-                    {
-                        "trailer_plate": trailer.plate,
-                        "location_name": current_location.name,
-                        "arrival_time": trailer.last_seen.isoformat()
-                    },
-                    db
-                )
-            
-            # Check if trailer entered a yard zone
-            yard_zone_id = determine_yard_zone(
-                request.latitude, request.longitude, 
-                str(current_location.id), db
-            )
-            
-            if yard_zone_id:
-                # Trailer is in a yard zone
-                if not current_position or current_position.yard_zone_id != yard_zone_id:
-                    # Exit previous position if exists
-                    if current_position:
-                        current_position.exited_at = datetime.utcnow()
-                    
-                    # Find available spot
-                    spot_number = find_available_spot(yard_zone_id, db)
-                    
-                    # Create new position record
-                    new_position = TrailerPosition(
-                        trailer_id=request.trailer_id,
-                        location_id=current_location.id,
-                        yard_zone_id=yard_zone_id,
-                        spot_number=spot_number,
-                        latitude=request.latitude,
-                        longitude=request.longitude,
-                        accuracy_meters=request.accuracy_meters
-                    )
-                    
-                    db.add(new_position)
-                    
-                    # Update trailer status
-                    trailer.status = TrailerStatusEnum.in_yard
-                    
-                    # Get zone info for event
-                    zone = db.query(YardZone).filter(YardZone.id == yard_zone_id).first()
-                    
-                    # Create yard entry event
-                    background_tasks.add_task(
-                        create_yard_event,
-                        "yard_entry",
-                        request.trailer_id,
-                        str(current_location.id),
-                        {
-                            "trailer_plate": trailer.plate,
-                            "zone_name": zone.zone_name if zone else "Unknown",
-                            "spot_number": spot_number,
-                            "entry_time": datetime.utcnow().isoformat()
-                        },
-                        db
-                    )
-            
-            elif current_position and current_position.yard_zone_id:
-                # Trailer left yard zone
-                current_position.exited_at = datetime.utcnow()
-                trailer.status = TrailerStatusEnum.at_gate
-                
-                # Create yard exit event
-                zone = db.query(YardZone).filter(
-                    YardZone.id == current_position.yard_zone_id
-                ).first()
-                
-                background_tasks.add_task(
-                    create_yard_event,
-                    "yard_exit",
-                    request.trailer_id,
-                    str(current_location.id),
-                    {
-                        "trailer_plate": trailer.plate,
-                        "zone_name": zone.zone_name if zone else "Unknown",
-                        "spot_number": current_position.spot_number,
-                        "exit_time": datetime.utcnow().isoformat()
-                    },
-                    db
-                )
+        return {
+            "message": "Trailer locations updated",
+            "processed": sum(1 for result in results if result),
+            "results": [
+                result or {"trailer_id": fix.trailer_id, "error": "Trailer not found"}
+                for fix, result in zip(request.updates, results)
+            ]
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update locations: {str(e)}")
+
+@app.put("/api/locations/{location_id}/gate-radius")
+async def update_gate_radius(
+    location_id: str,
+    request: GateRadiusUpdate,
+    db: Session = Depends(get_db)
+):
+    """Set how close to the gate a trailer counts as arrived"""
+    if request.radius_meters is not None and not 0 < request.radius_meters <= MAX_GATE_RADIUS_METERS:
+        raise HTTPException(status_code=400, detail=f"radius_meters must be between 0 and {MAX_GATE_RADIUS_METERS}")
+    
+    try:
+        location = db.query(Location).filter(Location.id == location_id).first()
         
-        else:
-            # Trailer is not at any location
-            if current_position:
-                current_position.exited_at = datetime.utcnow()
-            
-            if trailer.status in [TrailerStatusEnum.at_gate, TrailerStatusEnum.in_yard]:
-                trailer.status = TrailerStatusEnum.enroute
+        if not location:
+            raise HTTPException(status_code=404, detail="Location not found")
         
+        location.gate_radius_meters = request.radius_meters
         db.commit()
+        invalidate_yard_geometry()
         
         return {
-            "message": "Trailer location updated",
-            "trailer_id": request.trailer_id,
-            "current_status": trailer.status.value,
-            "at_location": current_location.name if current_location else None,
-            "in_yard_zone": yard_zone_id is not None
+            "message": "Gate radius updated",
+            "location_id": location_id,
+            "gate_radius_meters": location.gate_radius_meters or GATE_RADIUS_METERS
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update location: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to update gate radius: {str(e)}")
 
 @app.post("/api/yard-zones")
 async def create_yard_zone(
@@ -626,12 +1549,15 @@ async def create_yard_zone(
             zone_type=request.zone_type,
             capacity=request.capacity,
             geojson_boundary=geojson_boundary,
-            metadata=request.metadata
+            zone_metadata=request.metadata
         )
         
         db.add(zone)
+        db.flush()
+        db.add(YardZoneOccupancy(zone_id=zone.id, location_id=zone.location_id))
         db.commit()
         db.refresh(zone)
+        invalidate_yard_geometry()
         
         return {
             "message": "Yard zone created successfully",
@@ -673,7 +1599,7 @@ async def get_yard_zones(
             "zone_name": zone.zone_name,
             "zone_type": zone.zone_type,
             "capacity": zone.capacity,
-            "metadata": zone.metadata,
+            "metadata": zone.zone_metadata,
             "created_at": zone.created_at
         } for zone in zones
     ]
@@ -685,16 +1611,16 @@ async def get_yard_occupancy(
 ) -> List[YardOccupancyResponse]:
     """Get current yard occupancy for all zones at a location"""
     try:
-        zones = db.query(YardZone).filter(YardZone.location_id == location_id).all()
+        zones = db.query(
+            YardZone.id, YardZone.zone_name, YardZone.zone_type, YardZone.capacity,
+            func.coalesce(YardZoneOccupancy.occupied_count, 0).label("occupied_count")
+        ).outerjoin(
+            YardZoneOccupancy, YardZoneOccupancy.zone_id == YardZone.id
+        ).filter(YardZone.location_id == location_id).all()
         
         occupancy_data = []
         for zone in zones:
-            # Count current occupancy
-            current_occupancy = db.query(TrailerPosition).filter(
-                TrailerPosition.yard_zone_id == zone.id,
-                TrailerPosition.exited_at.is_(None)
-            ).count()
-            
+            current_occupancy = zone.occupied_count
             occupancy_percentage = (current_occupancy / zone.capacity) * 100 if zone.capacity > 0 else 0
             available_spots = max(0, zone.capacity - current_occupancy)
             
@@ -713,6 +1639,43 @@ async def get_yard_occupancy(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get yard occupancy: {str(e)}")
 
+@app.get("/api/yard-zones/{location_id}/moves")
+async def plan_yard_moves(
+    location_id: str,
+    hours: float = 4,
+    max_moves: int = 20,
+    db: Session = Depends(get_db)
+):
+    """Propose jockey moves for trailers departing in the next `hours`"""
+    try:
+        location = get_yard_geometry(db).locations.get(str(uuid.UUID(location_id)))
+        if not location:
+            raise HTTPException(status_code=404, detail="Location not found")
+        
+        trailers = db.query(Trailer, TrailerPosition).join(
+            TrailerPosition, TrailerPosition.trailer_id == Trailer.id
+        ).filter(
+            TrailerPosition.location_id == location_id,
+            TrailerPosition.exited_at.is_(None),
+            TrailerPosition.yard_zone_id.isnot(None)
+        ).all()
+        occupancies = {
+            str(occupancy.zone_id): occupancy
+            for occupancy in db.query(YardZoneOccupancy).filter(YardZoneOccupancy.location_id == location_id).all()
+        }
+        
+        moves = plan_jockey_moves(location, trailers, occupancies, datetime.utcnow(), hours, max_moves)
+        return {
+            "location_id": location_id,
+            "hours": hours,
+            "moves": moves
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to plan yard moves: {str(e)}")
+
 @app.get("/api/trailers/{trailer_id}/position")
 async def get_trailer_position(
     trailer_id: str,
@@ -794,17 +1757,59 @@ async def get_yard_events(
     
     events = query.order_by(LogisticsEvent.at.desc()).limit(limit).all()
     
-    return [
-        {
-            "id": str(event.id),
-            "location_id": str(event.location_id),
-            "type": event.type.value,
-            "ref_table": event.ref_table,
-            "ref_id": str(event.ref_id) if event.ref_id else None,
-            "payload": event.payload,
-            "at": event.at
-        } for event in events
-    ]
+    return [event_json(event) for event in events]
+
+@app.get("/api/events/tail")
+async def tail_yard_events(
+    since: int = 0,
+    location_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    limit: int = 100,
+    wait: float = 30
+):
+    """Long-poll for events after sequence number `since`"""
+    if event_type and event_type not in EventTypeEnum.__members__:
+        raise HTTPException(status_code=400, detail="Invalid event type")
+    
+    try:
+        events = await tail_events(since, location_id, event_type, limit, min(max(wait, 0), EVENT_TAIL_MAX_WAIT))
+        return {
+            "events": [event_json(event) for event in events],
+            "next_since": events[-1].seq if events else since
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to tail events: {str(e)}")
+
+@app.get("/api/events/stream")
+async def stream_yard_events(
+    since: int = 0,
+    location_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-sent events after `since`; reconnecting clients resume from Last-Event-ID"""
+    if last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    if event_type and event_type not in EventTypeEnum.__members__:
+        raise HTTPException(status_code=400, detail="Invalid event type")
+    
+    async def generate():
+        cursor = since
+        while True:
+            events = await tail_events(cursor, location_id, event_type, 100, 15)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event.seq}\nevent: {event.type.value}\ndata: {json.dumps(event_json(event), default=str)}\n\n"
+            cursor = events[-1].seq
+    
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
     import uvicorn
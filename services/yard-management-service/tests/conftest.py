@@ -0,0 +1,69 @@
+"""Fixtures for the yard-management-service tests.
+
+The service relies on Postgres features (row locking, ON CONFLICT, identity
+columns), so the tests run against a real database: point TEST_DATABASE_URL
+at a scratch database and run pytest from this service's directory, e.g.
+`TEST_DATABASE_URL=postgresql://... pytest tests`.
+"""
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+@pytest.fixture(scope="session")
+def main():
+    """The service module, configured for the test database"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    sys.path.insert(0, SERVICE_DIR)
+    import main
+    # The schema is owned by the deployment's migrations; indexes are built CONCURRENTLY, which needs autocommit
+    main.Base.metadata.create_all(main.engine.execution_options(isolation_level="AUTOCOMMIT"))
+    return main
+
+@pytest.fixture
+def db(main):
+    db = main.SessionLocal()
+    yield db
+    db.close()
+
+GATE = (40.0, -75.0)
+LAST_SEEN = datetime(2025, 1, 1)
+ZONE_RING = [[-75.0002, 39.9998], [-74.9998, 39.9998], [-74.9998, 40.0002], [-75.0002, 40.0002], [-75.0002, 39.9998]]
+
+@pytest.fixture
+def site(main, db):
+    """A location with its gate at GATE, one three-spot zone around it and one trailer"""
+    location = main.Location(
+        org_id=uuid.uuid4(), name=f"Yard {uuid.uuid4().hex[:6]}",
+        geojson_gate=json.dumps({"type": "Point", "coordinates": [GATE[1], GATE[0]]})
+    )
+    db.add(location)
+    db.flush()
+    zone = main.YardZone(
+        location_id=location.id, zone_name="A", capacity=3,
+        geojson_boundary=json.dumps({"type": "Polygon", "coordinates": [ZONE_RING]})
+    )
+    trailer = main.Trailer(carrier_id=uuid.uuid4(), plate=f"T-{uuid.uuid4().hex[:6]}", last_seen=LAST_SEEN)
+    db.add_all([zone, trailer])
+    db.commit()
+    return location, zone, trailer
+
+@pytest.fixture
+def geometry(main, site):
+    """Compiled geometry for the site, as get_yard_geometry would cache it"""
+    def geometry(with_zone: bool = True):
+        location, zone, _ = site
+        compiled = main.LocationGeometry(str(location.id), location.name, GATE)
+        zones = [main.CompiledZone(
+            str(zone.id), str(location.id), zone.zone_name, zone.capacity, main.parse_polygon(zone.geojson_boundary)
+        )] if with_zone else []
+        return main.YardGeometry([compiled], zones)
+    return geometry
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from conftest import GATE
+
+def fix(main, trailer, at, latitude=GATE[0], longitude=GATE[1]):
+    return main.TrailerLocationUpdate(trailer_id=str(trailer.id), latitude=latitude, longitude=longitude, timestamp=at)
+
+def occupancy(main, db, zone):
+    db.expire_all()
+    return db.get(main.YardZoneOccupancy, zone.id)
+
+def test_spot_is_freed_when_the_zone_left_cached_geometry(main, db, site, geometry):
+    _, zone, trailer = site
+    at = datetime(2025, 8, 1, 6)
+    main.apply_location_fixes([fix(main, trailer, at)], geometry(), db)
+    db.commit()
+    assert occupancy(main, db, zone).spot_bitmap == "1"
+    
+    # The zone's boundary was edited away after the geometry was cached
+    main.apply_location_fixes([fix(main, trailer, at + timedelta(minutes=5), latitude=41.0)], geometry(with_zone=False), db)
+    db.commit()
+    taken = occupancy(main, db, zone)
+    assert (taken.occupied_count, taken.spot_bitmap) == (0, "0")
+
+def test_positions_open_and_close_at_their_fix_times(main, db, site, geometry):
+    _, zone, trailer = site
+    entered, left = datetime(2025, 8, 2, 6), datetime(2025, 8, 2, 9)
+    compiled = geometry()
+    # One buffered upload covering the whole stay
+    main.apply_location_fixes([fix(main, trailer, left, latitude=41.0), fix(main, trailer, entered)], compiled, db)
+    db.commit()
+    
+    position = db.query(main.TrailerPosition).filter(main.TrailerPosition.trailer_id == trailer.id).one()
+    assert (position.entered_at, position.exited_at) == (entered, left)
+
+def test_fixes_older_than_last_seen_are_skipped(main, db, site, geometry):
+    _, zone, trailer = site
+    at = datetime(2025, 8, 3, 6)
+    compiled = geometry()
+    main.apply_location_fixes([fix(main, trailer, at)], compiled, db)
+    db.commit()
+    
+    # A delayed batch from before the trailer parked must not move it back out
+    results, events = main.apply_location_fixes([fix(main, trailer, at - timedelta(hours=1), latitude=41.0)], compiled, db)
+    db.commit()
+    assert results[0]["stale"] and events == []
+    db.expire_all()
+    assert db.get(main.Trailer, trailer.id).last_seen == at
+    assert occupancy(main, db, zone).occupied_count == 1
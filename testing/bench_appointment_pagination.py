@@ -0,0 +1,109 @@
+"""
+Appointment listing pagination benchmark for appointment-service
+
+Seeds a Postgres database with appointments (5M by default) and times one
+page of GET /api/appointments at increasing depths, with the keyset cursor
+and with the old OFFSET approach for comparison. Keyset pages should stay
+flat while OFFSET grows with depth.
+
+    DATABASE_URL=postgresql://... python testing/bench_appointment_pagination.py [--rows 5000000]
+
+The target database must be disposable: --create-schema creates the
+locations/docks/appointments tables, and seeding inserts rows tagged
+created_by='bench'.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "appointment-service"))
+
+import main  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+LOCATIONS = 10
+CARRIERS = 1000
+
+
+def seed(rows):
+    with main.engine.begin() as conn:
+        existing = conn.execute(text("SELECT count(*) FROM appointments WHERE created_by = 'bench'")).scalar()
+        if existing >= rows:
+            return existing
+        conn.execute(text(
+            "INSERT INTO locations (id, org_id, name, tz, created_at) "
+            "SELECT md5('loc' || g)::uuid, md5('org')::uuid, 'Bench ' || g, 'UTC', now() "
+            "FROM generate_series(0, :n - 1) g ON CONFLICT DO NOTHING"
+        ), {"n": LOCATIONS})
+        conn.execute(text(
+            "INSERT INTO appointments (id, location_id, carrier_id, window_start, window_end, "
+            "status, priority, created_by, created_at) "
+            "SELECT gen_random_uuid(), md5('loc' || (g % :locations))::uuid, "
+            "md5('carrier' || (g % :carriers))::uuid, "
+            "timestamp '2020-01-01' + g * interval '1 minute', "
+            "timestamp '2020-01-01' + g * interval '1 minute' + interval '1 hour', "
+            "(array['scheduled', 'arrived', 'departed', 'cancelled'])[1 + g % 4]::appointmentstatusenum, "
+            "1 + g % 10, 'bench', now() "
+            "FROM generate_series(:start, :end - 1) g"
+        ), {"locations": LOCATIONS, "carriers": CARRIERS, "start": existing, "end": rows})
+    with main.engine.connect() as conn:
+        conn.execute(text("COMMIT"))
+        conn.execute(text("ANALYZE appointments"))
+    return rows
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--create-schema", action="store_true")
+    args = parser.parse_args()
+
+    if args.create_schema:
+        # The listing indexes are built CONCURRENTLY, which needs autocommit
+        with main.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            main.Base.metadata.create_all(conn, tables=[
+                main.Location.__table__, main.Dock.__table__, main.Appointment.__table__
+            ])
+    main.ensure_reservation_ledger()  # creates the listing indexes
+
+    total = seed(args.rows)
+    location_id = main.uuid.UUID(bytes=bytes.fromhex(
+        main.SessionLocal().execute(text("SELECT md5('loc0')")).scalar()
+    ))
+    per_location = total // LOCATIONS
+    print(f"{total} appointments, {per_location} per location, page size {args.limit}")
+    print(f"{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+
+    db = main.SessionLocal()
+    depth = args.limit
+    while depth < per_location:
+        # Cursor for the row just before this depth; finding it is not timed
+        anchor = db.execute(text(
+            "SELECT window_start, id FROM appointments WHERE location_id = :loc "
+            "ORDER BY window_start, id OFFSET :offset LIMIT 1"
+        ), {"loc": location_id, "offset": depth - 1}).one()
+
+        keyset_ms = timed(lambda: main.list_appointments(
+            db, location_id=location_id, limit=args.limit, after=(anchor.window_start, anchor.id)
+        ))
+        offset_ms = timed(lambda: db.query(*main.APPOINTMENT_LIST_COLUMNS).filter(
+            main.Appointment.location_id == location_id
+        ).order_by(main.Appointment.window_start, main.Appointment.id).offset(depth).limit(args.limit).all())
+        print(f"{depth:>10} {keyset_ms:>10.2f} {offset_ms:>10.2f}")
+        depth *= 10
+    db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
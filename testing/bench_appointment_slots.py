@@ -0,0 +1,99 @@
+"""
+Slot availability benchmark for appointment-service
+
+Ranks slots for 200 docks and 10k appointments over a two-week window with
+the per-dock timelines and compares against the original full rescan.
+
+    python testing/bench_appointment_slots.py [--docks 200] [--appointments 10000] [--days 14]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "appointment-service"))
+
+import main  # noqa: E402
+
+
+def make_fixture(num_docks, num_appointments, days, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 5)
+    docks = [SimpleNamespace(id=uuid.uuid4(), door_no=f"D{i:03d}", capabilities={}) for i in range(num_docks)]
+    statuses = main.ACTIVE_APPOINTMENT_STATUSES
+    appointments = []
+    for _ in range(num_appointments):
+        window_start = start + timedelta(minutes=30 * rng.randrange(days * 48))
+        appointments.append(SimpleNamespace(
+            dock_id=rng.choice(docks).id,
+            window_start=window_start,
+            window_end=window_start + timedelta(minutes=rng.choice([30, 60, 90, 120])),
+            priority=rng.randint(1, 10),
+            status=rng.choice(statuses),
+        ))
+    return docks, appointments, start, start + timedelta(days=days)
+
+
+def rescan_slots(docks, appointments, start_date, end_date, duration_minutes):
+    """The original O(slots x docks x appointments) loop, kept as a reference"""
+    recommendations = []
+    current_time = start_date
+    slot_duration = timedelta(minutes=duration_minutes)
+    while current_time + slot_duration <= end_date:
+        slot_end = current_time + slot_duration
+        if 6 <= current_time.hour < 18:
+            best_dock = None
+            best_score = 0
+            for dock in docks:
+                dock_appointments = [appt for appt in appointments if appt.dock_id == dock.id]
+                score = main.calculate_availability_score(current_time, slot_end, dock_appointments)
+                if score > best_score:
+                    best_score = score
+                    best_dock = dock
+            if best_dock and best_score > 0.3:
+                recommendations.append((current_time, best_dock.id, best_score))
+        current_time += timedelta(minutes=30)
+    recommendations.sort(key=lambda x: x[2], reverse=True)
+    return recommendations[:20]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docks", type=int, default=200)
+    parser.add_argument("--appointments", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--skip-rescan", action="store_true", help="only time the indexed path")
+    args = parser.parse_args()
+
+    docks, appointments, start, end = make_fixture(args.docks, args.appointments, args.days)
+    print(f"{args.docks} docks, {args.appointments} appointments, {args.days} days")
+
+    indexed, indexed_s = timed(main.rank_slots, docks, appointments, start, end, args.duration)
+    print(f"timelines: {indexed_s * 1000:.1f} ms, {len(indexed)} slots")
+
+    if args.skip_rescan:
+        return
+
+    rescan, rescan_s = timed(rescan_slots, docks, appointments, start, end, args.duration)
+    print(f"rescan:    {rescan_s * 1000:.1f} ms, {len(rescan)} slots ({rescan_s / indexed_s:.0f}x)")
+
+    same = [(r.slot_start, r.dock_id, round(r.availability_score, 9)) for r in indexed] == \
+        [(slot, str(dock_id), round(score, 9)) for slot, dock_id, score in rescan]
+    print("results match" if same else "RESULTS DIFFER")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
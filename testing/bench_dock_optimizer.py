@@ -0,0 +1,107 @@
+"""
+Dock schedule optimizer benchmark for appointment-service
+
+Plans one day of 500 appointments over 60 docks with mixed equipment and
+feature requirements, checks the plan for overlaps and capability
+mismatches, and reports how long the solve took (target: under a second).
+
+    python testing/bench_dock_optimizer.py [--docks 60] [--appointments 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "appointment-service"))
+
+import main  # noqa: E402
+
+EQUIPMENT_TYPES = ["van", "reefer", "flatbed"]
+FEATURES = ["liftgate", "ramp", "hazmat"]
+
+
+def make_fixture(num_docks, num_appointments, seed=7):
+    rng = random.Random(seed)
+    day = datetime(2026, 1, 6)
+    docks = [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            door_no=f"D{i:03d}",
+            status=main.DockStatusEnum.available,
+            updated_at=None,
+            capabilities={
+                "equipment_types": rng.sample(EQUIPMENT_TYPES, rng.randint(1, 3)),
+                "features": rng.sample(FEATURES, rng.randint(0, 2)),
+                "max_height_feet": rng.choice([13, 13.5, 14]),
+            },
+        )
+        for i in range(num_docks)
+    ]
+    appointments = []
+    for _ in range(num_appointments):
+        window_start = day + timedelta(minutes=30 * rng.randrange(5 * 2, 21 * 2))
+        requirements = {"equipment_type": rng.choice(EQUIPMENT_TYPES)}
+        if rng.random() < 0.2:
+            requirements["features"] = [rng.choice(FEATURES)]
+        appointments.append(SimpleNamespace(
+            id=uuid.uuid4(),
+            dock_id=rng.choice(docks).id if rng.random() < 0.5 else None,
+            window_start=window_start,
+            window_end=window_start + timedelta(minutes=rng.choice([60, 90, 120])),
+            priority=rng.randint(1, 10),
+            status=rng.choice([main.AppointmentStatusEnum.scheduled] * 9 + [main.AppointmentStatusEnum.loading]),
+            dock_requirements=requirements,
+        ))
+    return docks, appointments
+
+
+def check_plan(plan, appointments, eligible, docks):
+    dock_pos = {dock.id: pos for pos, dock in enumerate(docks)}
+    by_dock = {}
+    for appt in appointments:
+        if appt.id in plan:
+            dock = plan[appt.id]
+            if not eligible[appt.id] >> dock_pos[dock.id] & 1 and appt.status not in main.RUNNING_APPOINTMENT_STATUSES:
+                return f"{appt.id} placed on incompatible dock {dock.door_no}"
+            by_dock.setdefault(dock.id, []).append(appt)
+    for appts in by_dock.values():
+        appts.sort(key=lambda a: a.window_start)
+        for prev, nxt in zip(appts, appts[1:]):
+            if nxt.window_start < prev.window_end and not (
+                    prev.status in main.RUNNING_APPOINTMENT_STATUSES and nxt.status in main.RUNNING_APPOINTMENT_STATUSES):
+                return f"overlap on dock between {prev.id} and {nxt.id}"
+    return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docks", type=int, default=60)
+    parser.add_argument("--appointments", type=int, default=500)
+    args = parser.parse_args()
+
+    docks, appointments = make_fixture(args.docks, args.appointments)
+    index = main.DockCapabilityIndex(docks)
+    eligible = {appt.id: index.compatible(appt.dock_requirements) for appt in appointments}
+
+    started = time.perf_counter()
+    plan, kept = main.optimize_dock_schedule(appointments, docks, eligible, [])
+    elapsed = time.perf_counter() - started
+
+    placed_priority = sum(appt.priority for appt in appointments if appt.id in plan)
+    total_priority = sum(appt.priority for appt in appointments)
+    print(f"{args.docks} docks, {args.appointments} appointments")
+    print(f"solve: {elapsed * 1000:.1f} ms, placed {len(plan)}/{len(appointments)}, "
+          f"priority {placed_priority}/{total_priority}")
+
+    problem = check_plan(plan, appointments, eligible, docks)
+    print(problem or "plan is conflict-free and compatible")
+    sys.exit(1 if problem or elapsed >= 1.0 else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
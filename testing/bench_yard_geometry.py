@@ -0,0 +1,108 @@
+"""
+Yard geometry benchmark for yard-management-service
+
+Resolves trailer pings to a location and yard zone with the compiled
+geometry cache and compares against the original per-ping path that parses
+every gate and zone boundary from GeoJSON.
+
+    python testing/bench_yard_geometry.py [--locations 500] [--zones 20] [--pings 5000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "yard-management-service"))
+
+import main  # noqa: E402
+
+
+def make_fixture(num_locations, zones_per_location, num_pings, seed=42):
+    rng = random.Random(seed)
+    locations, zones, pings = [], [], []
+    for _ in range(num_locations):
+        lat, lon = rng.uniform(25, 48), rng.uniform(-123, -70)
+        location = SimpleNamespace(
+            id=uuid.uuid4(), name=f"Yard {len(locations)}",
+            geojson_gate=json.dumps({"type": "Point", "coordinates": [lon, lat]})
+        )
+        locations.append(location)
+        for z in range(zones_per_location):
+            south, west = lat + 0.0001 * (z // 5), lon + 0.0002 * (z % 5)
+            ring = [[west, south], [west + 0.00015, south], [west + 0.00015, south + 0.00008],
+                    [west, south + 0.00008], [west, south]]
+            zones.append(SimpleNamespace(
+                id=uuid.uuid4(), location_id=location.id, zone_name=f"Z{z}", capacity=20,
+                geojson_boundary=json.dumps({"type": "Polygon", "coordinates": [ring]})
+            ))
+        for _ in range(num_pings // num_locations):
+            pings.append((lat + rng.uniform(-0.0002, 0.0006), lon + rng.uniform(-0.0002, 0.001)))
+    return locations, zones, pings
+
+
+def original_lookup(locations, zones_by_location, latitude, longitude):
+    """The original per-ping scan, parsing GeoJSON each time"""
+    for location in locations:
+        gate_data = json.loads(location.geojson_gate)
+        gate_coords = gate_data["coordinates"]
+        if main.calculate_distance(latitude, longitude, gate_coords[1], gate_coords[0]) <= 100:
+            for zone in zones_by_location[location.id]:
+                coordinates = json.loads(zone.geojson_boundary)["coordinates"][0]
+                polygon_coords = [{"lat": coord[1], "lon": coord[0]} for coord in coordinates]
+                if main.is_point_in_polygon(latitude, longitude, polygon_coords):
+                    return str(location.id), str(zone.id)
+            return str(location.id), None
+    return None, None
+
+
+def compiled_lookup(geometry, latitude, longitude):
+    location = geometry.location_at(latitude, longitude)
+    if not location:
+        return None, None
+    zone = geometry.zone_at(location.id, latitude, longitude)
+    return location.id, zone.id if zone else None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--zones", type=int, default=20)
+    parser.add_argument("--pings", type=int, default=5000)
+    args = parser.parse_args()
+
+    locations, zones, pings = make_fixture(args.locations, args.zones, args.pings)
+    zones_by_location = {location.id: [] for location in locations}
+    for zone in zones:
+        zones_by_location[zone.location_id].append(zone)
+    print(f"{args.locations} locations, {len(zones)} zones, {len(pings)} pings")
+
+    started = time.perf_counter()
+    geometry = main.YardGeometry(
+        [main.LocationGeometry(str(l.id), l.name, main.parse_gate(l.geojson_gate)) for l in locations],
+        [main.CompiledZone(str(z.id), str(z.location_id), z.zone_name, z.capacity,
+                           main.parse_polygon(z.geojson_boundary)) for z in zones]
+    )
+    print(f"compile:  {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    compiled = [compiled_lookup(geometry, lat, lon) for lat, lon in pings]
+    compiled_s = time.perf_counter() - started
+    print(f"compiled: {compiled_s / len(pings) * 1e6:.1f} us/ping")
+
+    started = time.perf_counter()
+    original = [original_lookup(locations, zones_by_location, lat, lon) for lat, lon in pings]
+    original_s = time.perf_counter() - started
+    print(f"original: {original_s / len(pings) * 1e6:.1f} us/ping ({original_s / compiled_s:.0f}x)")
+
+    same = compiled == original
+    print("results match" if same else "RESULTS DIFFER")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main_cli()